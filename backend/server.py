@@ -1,21 +1,70 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter
+from typing import List, Optional, Dict, Any, AsyncIterator, Union, Callable, Awaitable
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 from pathlib import Path
 import os
+import sys
+import importlib.util
+import functools
 import logging
+import asyncio
+import time
 import uuid
 import bcrypt
 import jwt
-import razorpay
-import httpx
 import json
+import base64
+import random
+from contextvars import ContextVar
+import bisect
+import heapq
+import hashlib
+import io
+import gzip
+import re
+from collections import OrderedDict, Counter
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne, IndexModel
+from pymongo.errors import DuplicateKeyError
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+try:
+    import brotli
+except ImportError:  # gzip-only compression
+    brotli = None
+
+def lazy_import(name: str):
+    """Return `name` as a module that is only executed on first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# Only needed by payments, storage calls, the related-products index and image
+# rendering, so they stay off the cold-start path until first use
+razorpay = lazy_import("razorpay")
+requests = lazy_import("requests")
+httpx = lazy_import("httpx")
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+pil_features = lazy_import("PIL.features")
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -25,6 +74,31 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Read preference routing
+# `db` stays on the primary for auth, orders and anything needing read-your-writes.
+# Catalog browsing and admin analytics can tolerate bounded staleness and are
+# routed to secondaries so they scale out with replica-set members.
+READ_MAX_STALENESS_SECONDS = int(os.environ.get('READ_MAX_STALENESS_SECONDS', '90'))
+CATALOG_READ_PREFERENCE = os.environ.get('CATALOG_READ_PREFERENCE', 'secondaryPreferred')
+ANALYTICS_READ_PREFERENCE = os.environ.get('ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+
+READ_PREFERENCE_MODES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def build_read_preference(mode: str):
+    if mode == "primary":
+        return Primary()
+    if mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"Unknown read preference: {mode}")
+    return READ_PREFERENCE_MODES[mode](max_staleness=READ_MAX_STALENESS_SECONDS)
+
+catalog_db = client.get_database(os.environ['DB_NAME'], read_preference=build_read_preference(CATALOG_READ_PREFERENCE))
+analytics_db = client.get_database(os.environ['DB_NAME'], read_preference=build_read_preference(ANALYTICS_READ_PREFERENCE))
+
 # JWT Config
 JWT_SECRET = os.environ['JWT_SECRET']
 JWT_ALGORITHM = os.environ['JWT_ALGORITHM']
@@ -32,16 +106,26 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ['ACCESS_TOKEN_EXPIRE_MINUTES'])
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ['REFRESH_TOKEN_EXPIRE_DAYS'])
 
 # Razorpay Client
-razorpay_client = razorpay.Client(auth=(os.environ['RAZORPAY_KEY_ID'], os.environ['RAZORPAY_KEY_SECRET']))
+RAZORPAY_KEY_ID = os.environ['RAZORPAY_KEY_ID']
+RAZORPAY_KEY_SECRET = os.environ['RAZORPAY_KEY_SECRET']
+razorpay_client = None
+
+def get_razorpay_client():
+    global razorpay_client
+    if razorpay_client is None:
+        razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+    return razorpay_client
 
 # Supabase Config
 SUPABASE_URL = os.environ['SUPABASE_URL']
 SUPABASE_KEY = os.environ['SUPABASE_ANON_KEY']
 SUPABASE_BUCKET = os.environ['SUPABASE_BUCKET_NAME']
+SUPABASE_IMAGE_BUCKET = os.environ.get('SUPABASE_IMAGE_BUCKET_NAME', SUPABASE_BUCKET)
 
 app = FastAPI(title="CodeMart API")
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Models
 class UserBase(BaseModel):
@@ -85,16 +169,43 @@ class Product(ProductBase):
     model_config = ConfigDict(extra="ignore")
     id: str
     file_path: Optional[str] = None
+    file_hash: Optional[str] = None
+    file_version: int = 0
     downloads: int = 0
     rating: float = 0.0
     reviews_count: int = 0
+    version: int = 0
+    thumbnail_variants: Optional[Dict[str, Dict[str, str]]] = None
+    gallery_variants: List[Dict[str, Dict[str, str]]] = []
     created_at: datetime
 
 class ProductCreate(ProductBase):
     pass
 
-class OrderBase(BaseModel):
+class ProductSummary(BaseModel):
+    """Listing-card view of a product, served by `GET /products?view=summary`."""
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    title: str
+    tagline: str
+    price: float
+    category: str
+    tags: List[str]
+    thumbnail: Optional[str] = None
+    thumbnail_variants: Optional[Dict[str, Dict[str, str]]] = None
+    downloads: int = 0
+    rating: float = 0.0
+    reviews_count: int = 0
+
+class OrderItem(BaseModel):
     product_id: str
+    title: str
+    price: float
+    amount: float
+    license_key: Optional[str] = None
+
+class OrderBase(BaseModel):
+    product_id: Optional[str] = None
     user_id: str
     amount: float
     coupon_code: Optional[str] = None
@@ -108,12 +219,22 @@ class Order(OrderBase):
     license_key: Optional[str] = None
     created_at: datetime
     paid_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    items: List[OrderItem] = []
+
+class CartCheckout(BaseModel):
+    product_ids: List[str] = Field(min_length=1, max_length=50)
+    coupon_code: Optional[str] = None
 
 class PaymentVerification(BaseModel):
     razorpay_order_id: str
     razorpay_payment_id: str
     razorpay_signature: str
 
+class LicenseVerification(BaseModel):
+    license_key: str = Field(max_length=64)
+    product_id: Optional[str] = None
+
 class CouponBase(BaseModel):
     code: str
     discount_type: str  # "flat" or "percent"
@@ -141,6 +262,42 @@ class Review(ReviewBase):
     user_name: str
     is_approved: bool = False
     created_at: datetime
+    rejected_at: Optional[datetime] = None
+
+REVIEW_MODERATION_EVENTS = {"approve": "reviews.approved", "reject": "reviews.rejected"}
+
+class ReviewModeration(BaseModel):
+    review_ids: List[str] = Field(min_length=1, max_length=5000)
+    action: str  # "approve" or "reject"
+
+class RatingSummary(BaseModel):
+    average: float = 0.0
+    count: int = 0
+    histogram: Dict[int, int]
+
+class RelatedProduct(BaseModel):
+    id: str
+    title: str
+    tagline: str
+    price: float
+    category: str
+    thumbnail: Optional[str] = None
+    rating: float = 0.0
+    downloads: int = 0
+    score: float
+
+class Suggestion(BaseModel):
+    text: str
+    kind: str  # "title", "tag" or "tech"
+    product_id: Optional[str] = None
+    score: float
+
+class ProductDetail(BaseModel):
+    product: Product
+    reviews: List[Review]
+    rating_summary: RatingSummary
+    owned: bool = False
+    order_id: Optional[str] = None
 
 # Auth Utilities
 def hash_password(password: str) -> str:
@@ -165,16 +322,284 @@ def decode_token(token: str) -> dict:
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     payload = decode_token(credentials.credentials)
+    if payload.get("purpose"):
+        # Single-purpose tokens (e.g. admin event streams) never authenticate regular requests
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     user = await db.users.find_one({"id": payload["sub"]}, {"_id": 0})
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
 
+async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Optional[dict]:
+    if not credentials:
+        return None
+    try:
+        return await get_current_user(credentials)
+    except HTTPException:
+        return None
+
 async def get_admin_user(user: dict = Depends(get_current_user)) -> dict:
     if user["role"] != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return user
 
+# Outbound Resilience
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', '30'))
+# Uploads spend most of their time receiving the body and streams are long-lived by design,
+# so they get no request-wide budget; their outbound calls keep their own timeouts
+DEADLINE_EXEMPT_PATHS = re.compile(r"^/api/admin/(products/[^/]+/(upload|images)|events)$")
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+RETRY_BASE_DELAY_SECONDS = 0.2
+SIGN_HEDGE_AFTER_SECONDS = float(os.environ.get('SIGN_HEDGE_AFTER_SECONDS', '0.5'))
+
+# Monotonic deadline of the incoming request, set by DeadlineMiddleware
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+class DependencyError(Exception):
+    pass
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; one half-open probe after `reset_seconds`."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            return True
+        if self.state == "closed":
+            return True
+        self.total_rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        self.total_failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def abandon_probe(self):
+        # A probe that ended without a verdict (cancelled, caller error) must not pin the breaker half-open
+        if self.state == "half_open":
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def retry_after(self) -> int:
+        return max(1, int(self.reset_seconds - (time.monotonic() - self.opened_at)))
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected
+        }
+
+breakers = {
+    name: CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+    for name in ["razorpay", "supabase"]
+}
+
+def remaining_budget(timeout: float) -> float:
+    deadline = request_deadline.get()
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Request deadline exceeded")
+    return min(timeout, remaining)
+
+async def run_hedged(attempt: Callable[[float], Awaitable[Any]], timeout: float, hedge_after: float):
+    # Start a second identical attempt if the first is slow; the first success wins
+    started = time.monotonic()
+    pending = {asyncio.create_task(attempt(timeout))}
+    hedged = False
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            elapsed = time.monotonic() - started
+            if elapsed >= timeout:
+                raise asyncio.TimeoutError()
+            wait_for = timeout - elapsed if hedged else min(hedge_after, timeout) - elapsed
+            done, pending = await asyncio.wait(pending, timeout=max(0, wait_for), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            if not hedged and time.monotonic() - started < timeout:
+                pending.add(asyncio.create_task(attempt(timeout - (time.monotonic() - started))))
+                hedged = True
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def call_dependency(
+    name: str,
+    operation: Callable[[float], Awaitable[Any]],
+    timeout: float,
+    retries: int = 0,
+    hedge_after: Optional[float] = None,
+    bound_total: bool = True
+):
+    """Run `operation(timeout)` against dependency `name` behind its circuit breaker.
+
+    Transport errors, timeouts, DependencyError and 5xx httpx responses count as
+    failures. Only pass `retries`/`hedge_after` for idempotent operations. The
+    timeout of every attempt is capped by the incoming request's deadline.
+    With `bound_total=False` the attempt as a whole is not cut off and only the
+    operation's own (e.g. httpx per-phase) timeouts apply, for streamed bodies
+    whose transfer time grows with their size.
+    """
+    breaker = breakers[name]
+    
+    async def attempt(attempt_timeout: float):
+        if bound_total:
+            result = await asyncio.wait_for(operation(attempt_timeout), attempt_timeout)
+        else:
+            result = await operation(attempt_timeout)
+        if isinstance(result, httpx.Response) and result.status_code >= 500:
+            raise DependencyError(f"{name} responded with {result.status_code}")
+        return result
+    
+    for attempt_number in range(retries + 1):
+        # Checked before allow() so an exhausted deadline never consumes a half-open probe
+        budget = remaining_budget(timeout)
+        if not breaker.allow():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"{name} is temporarily unavailable",
+                headers={"Retry-After": str(breaker.retry_after())}
+            )
+        outcome = None
+        try:
+            if hedge_after is not None:
+                result = await run_hedged(attempt, budget, hedge_after)
+            else:
+                result = await attempt(budget)
+            outcome = "success"
+        except (httpx.TransportError, asyncio.TimeoutError, DependencyError) as exc:
+            outcome = "failure"
+            breaker.record_failure()
+            logger.warning(f"{name} call failed (attempt {attempt_number + 1}): {exc!r}")
+            if attempt_number == retries:
+                if isinstance(exc, asyncio.TimeoutError):
+                    raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=f"{name} request timed out")
+                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"{name} request failed")
+        finally:
+            if outcome == "success":
+                breaker.record_success()
+            elif outcome is None:
+                breaker.abandon_probe()
+        if outcome == "success":
+            return result
+        backoff = random.uniform(0, RETRY_BASE_DELAY_SECONDS * 2 ** attempt_number)
+        await asyncio.sleep(min(backoff, remaining_budget(timeout)))
+
+async def create_razorpay_order(payload: dict) -> dict:
+    async def operation(timeout: float):
+        try:
+            return await asyncio.to_thread(get_razorpay_client().order.create, payload, timeout=timeout)
+        except (razorpay.errors.ServerError, razorpay.errors.GatewayError, requests.exceptions.RequestException) as exc:
+            raise DependencyError(str(exc)) from exc
+    
+    # Not retried: a retry after an ambiguous failure could create a second Razorpay order
+    return await call_dependency("razorpay", operation, timeout=15.0)
+
+class DeadlineMiddleware:
+    """Bounds outbound calls by the request's time budget.
+
+    Clients may shorten the budget with an `X-Request-Timeout-Ms` header.
+    Paths matching DEADLINE_EXEMPT_PATHS run without a budget.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or DEADLINE_EXEMPT_PATHS.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        
+        budget = REQUEST_DEADLINE_SECONDS
+        requested = Headers(scope=scope).get("x-request-timeout-ms")
+        if requested and requested.isdigit():
+            budget = min(budget, int(requested) / 1000)
+        token = request_deadline.set(time.monotonic() + budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
+
+# Storage Utilities
+async def upload_to_storage(
+    bucket: str,
+    path: str,
+    content: Union[bytes, AsyncIterator[bytes]],
+    content_type: str,
+    upsert: bool = False,
+    content_length: Optional[int] = None
+):
+    headers = {
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Content-Type": content_type
+    }
+    if upsert:
+        headers["x-upsert"] = "true"
+    if content_length is not None:
+        headers["Content-Length"] = str(content_length)
+    
+    async def operation(timeout: float):
+        async with httpx.AsyncClient() as client:
+            return await client.post(
+                f"{SUPABASE_URL}/storage/v1/object/{bucket}/{path}",
+                headers=headers,
+                content=content,
+                timeout=timeout
+            )
+    
+    # Only upserts of in-memory bodies can be safely replayed
+    in_memory = isinstance(content, bytes)
+    retries = 2 if upsert and in_memory else 0
+    # The 30s is a per-phase httpx timeout; a streamed bundle may take far longer in total
+    upload_response = await call_dependency("supabase", operation, timeout=30.0, retries=retries, bound_total=in_memory)
+    
+    if upload_response.status_code not in [200, 201]:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="File upload failed")
+
+async def delete_from_storage(bucket: str, paths: List[str]):
+    async def operation(timeout: float):
+        async with httpx.AsyncClient() as client:
+            return await client.request(
+                "DELETE",
+                f"{SUPABASE_URL}/storage/v1/object/{bucket}",
+                headers={"Authorization": f"Bearer {SUPABASE_KEY}"},
+                json={"prefixes": paths},
+                timeout=timeout
+            )
+    
+    delete_response = await call_dependency("supabase", operation, timeout=30.0, retries=2)
+    
+    if delete_response.status_code != 200:
+        raise RuntimeError(f"Storage delete failed with status {delete_response.status_code}")
+
+def public_storage_url(bucket: str, path: str) -> str:
+    return f"{SUPABASE_URL}/storage/v1/object/public/{bucket}/{path}"
+
 # Auth Routes
 @api_router.post("/auth/register", response_model=TokenResponse)
 async def register(user_data: UserCreate):
@@ -244,17 +669,32 @@ async def get_me(user: dict = Depends(get_current_user)):
     )
 
 # Public Product Routes
-@api_router.get("/products", response_model=List[Product])
+# Projected listings bypass Product validation but must serialise like it does
+PROJECTED_PRODUCTS = TypeAdapter(List[Dict[str, Any]])
+
+@api_router.get("/products", response_model=Union[List[Product], List[ProductSummary], List[Dict[str, Any]]])
 async def get_products(
     category: Optional[str] = None,
     search: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     tags: Optional[str] = None,
-    sort: str = "newest"
+    sort: str = "newest",
+    fields: Optional[str] = None,
+    view: str = Query(default="full", pattern="^(full|summary)$")
 ):
     query = {"is_published": True}
     
+    projection = {"_id": 0}
+    if fields:
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - set(Product.model_fields)
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        projection.update({field: 1 for field in requested | {"id"}})
+    elif view == "summary":
+        projection.update({field: 1 for field in ProductSummary.model_fields})
+    
     if category:
         query["category"] = category
     if min_price is not None:
@@ -280,22 +720,563 @@ async def get_products(
         "rating": [("rating", -1)]
     }
     
-    products = await db.products.find(query, {"_id": 0}).sort(sort_options.get(sort, [("created_at", -1)])).to_list(100)
+    leaderboard_metric = LEADERBOARD_SORTS.get(sort)
+    if leaderboard_metric and leaderboards.ready and not (search or tags or min_price is not None or max_price is not None):
+        top_ids = [product_id for product_id, _ in leaderboards.top(leaderboard_metric, 100, category=category)]
+        products = await catalog_db.products.find({**query, "id": {"$in": top_ids}}, projection).to_list(100)
+        rank = {product_id: i for i, product_id in enumerate(top_ids)}
+        products.sort(key=lambda product: rank[product["id"]])
+    else:
+        products = await catalog_db.products.find(query, projection).sort(sort_options.get(sort, [("created_at", -1)])).to_list(100)
     
     for product in products:
-        product["created_at"] = datetime.fromisoformat(product["created_at"])
+        if "created_at" in product:
+            product["created_at"] = datetime.fromisoformat(product["created_at"])
+    
+    if len(projection) > 1:
+        # Skip Product validation for partial documents; the adapter still gives created_at Product's format
+        return JSONResponse(PROJECTED_PRODUCTS.dump_python(products, mode="json"))
     
     return products
 
+# Search Suggestions
+SUGGEST_MAX_RESULTS = int(os.environ.get('SUGGEST_MAX_RESULTS', '10'))
+SUGGEST_REBUILD_SECONDS = int(os.environ.get('SUGGEST_REBUILD_SECONDS', '900'))
+# Prefixes this short match most of the catalog, so their top results are memoised until the index changes
+SUGGEST_CACHED_PREFIX_LENGTH = 2
+SUGGEST_SOURCE_PROJECTION = {"_id": 0, "id": 1, "title": 1, "tags": 1, "tech_stack": 1, "downloads": 1, "is_published": 1}
+
+class SuggestionIndex:
+    """Prefix index over published product titles, tags and tech_stack entries.
+
+    Match keys live in one sorted list of (key, term_id) so a prefix is a
+    bisect plus a contiguous scan. Titles are keyed from every word onwards so
+    "dash" finds "Admin Dashboard". A tag or tech term is shared by all products
+    carrying it and weighs the sum of their downloads.
+    """
+
+    def __init__(self):
+        self.keys: List[tuple] = []
+        self.terms: Dict[tuple, dict] = {}
+        self.products: Dict[str, List[tuple]] = {}
+        self.short_prefixes: Dict[str, List[dict]] = {}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    @staticmethod
+    def match_keys(normalized: str) -> List[str]:
+        words = normalized.split(" ")
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def build(self, products: List[dict]):
+        for product in products:
+            self.upsert(product)
+
+    def upsert(self, product: dict):
+        self.remove(product["id"])
+        self.short_prefixes.clear()
+        if not product.get("is_published"):
+            return
+        weight = product.get("downloads", 0) + 1
+        entries = [("title", product["title"])]
+        entries += [("tag", tag) for tag in product.get("tags", [])]
+        entries += [("tech", tech) for tech in product.get("tech_stack", [])]
+        
+        term_ids = []
+        for kind, text in entries:
+            normalized = self.normalize(text)
+            if not normalized:
+                continue
+            term_id = (kind, product["id"] if kind == "title" else normalized)
+            if term_id in term_ids:
+                continue
+            term = self.terms.get(term_id)
+            if term is None:
+                term = self.terms[term_id] = {"text": text.strip(), "kind": kind, "weights": {}, "weight": 0}
+                for key in self.match_keys(normalized):
+                    bisect.insort(self.keys, (key, term_id))
+            term["weights"][product["id"]] = weight
+            term["weight"] += weight
+            term_ids.append(term_id)
+        self.products[product["id"]] = term_ids
+
+    def remove(self, product_id: str):
+        self.short_prefixes.clear()
+        for term_id in self.products.pop(product_id, []):
+            term = self.terms[term_id]
+            term["weight"] -= term["weights"].pop(product_id)
+            if term["weights"]:
+                continue
+            for key in self.match_keys(self.normalize(term["text"])):
+                position = bisect.bisect_left(self.keys, (key, term_id))
+                del self.keys[position]
+            del self.terms[term_id]
+
+    def increment_downloads(self, product_id: str):
+        self.short_prefixes.clear()
+        for term_id in self.products.get(product_id, []):
+            term = self.terms[term_id]
+            term["weights"][product_id] += 1
+            term["weight"] += 1
+
+    def suggest(self, prefix: str, limit: int) -> List[dict]:
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= SUGGEST_CACHED_PREFIX_LENGTH:
+            cached = self.short_prefixes.get(prefix)
+            if cached is None:
+                cached = self.scan(prefix, SUGGEST_MAX_RESULTS)
+                # Only prefixes of indexed keys are kept, so arbitrary queries cannot grow the memo
+                if cached:
+                    self.short_prefixes[prefix] = cached
+            return cached[:limit]
+        return self.scan(prefix, limit)
+
+    def scan(self, prefix: str, limit: int) -> List[dict]:
+        matches = set()
+        position = bisect.bisect_left(self.keys, (prefix,))
+        while position < len(self.keys) and self.keys[position][0].startswith(prefix):
+            matches.add(self.keys[position][1])
+            position += 1
+        
+        best = heapq.nlargest(limit, matches, key=lambda term_id: (self.terms[term_id]["weight"], term_id))
+        return [{
+            "text": self.terms[term_id]["text"],
+            "kind": term_id[0],
+            "product_id": term_id[1] if term_id[0] == "title" else None,
+            "score": self.terms[term_id]["weight"]
+        } for term_id in best]
+
+suggestion_index = SuggestionIndex()
+suggestion_index_lock = asyncio.Lock()
+
+async def rebuild_suggestion_index():
+    async with suggestion_index_lock:
+        products = await catalog_db.products.find({"is_published": True}, SUGGEST_SOURCE_PROJECTION).to_list(None)
+        fresh = SuggestionIndex()
+        await asyncio.to_thread(fresh.build, products)
+        # Swap in one step so readers never see a half-built index
+        suggestion_index.__dict__.update(fresh.__dict__)
+    logger.info(f"Suggestion index rebuilt for {len(products)} products")
+
+async def suggestion_index_rebuild_loop():
+    while True:
+        try:
+            await rebuild_suggestion_index()
+        except Exception:
+            logger.exception("Suggestion index rebuild failed")
+        await asyncio.sleep(SUGGEST_REBUILD_SECONDS)
+
+async def refresh_suggestions(product_id: str):
+    product = await db.products.find_one({"id": product_id}, SUGGEST_SOURCE_PROJECTION)
+    async with suggestion_index_lock:
+        if product:
+            suggestion_index.upsert(product)
+        else:
+            suggestion_index.remove(product_id)
+
+# Declared before /products/{product_id} so "suggest" is not captured as a product id
+@api_router.get("/products/suggest", response_model=List[Suggestion])
+async def suggest_products(
+    q: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=8, ge=1, le=SUGGEST_MAX_RESULTS)
+):
+    return suggestion_index.suggest(q, limit)
+
 @api_router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id, "is_published": True}, {"_id": 0})
+    product = await catalog_db.products.find_one({"id": product_id, "is_published": True}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
     product["created_at"] = datetime.fromisoformat(product["created_at"])
     return product
 
+# Product Detail
+PRODUCT_DETAIL_CACHE_TTL_SECONDS = int(os.environ.get('PRODUCT_DETAIL_CACHE_TTL_SECONDS', '60'))
+PRODUCT_DETAIL_REVIEWS_LIMIT = 10
+
+# product_id -> {"expires_at", "payload"}; invalidated whenever the product version is bumped
+product_detail_cache: Dict[str, Dict[str, Any]] = {}
+
+def invalidate_product_detail(product_id: str):
+    product_detail_cache.pop(product_id, None)
+    catalog_response_cache.clear()
+
+async def get_rating_summary(product_id: str) -> dict:
+    buckets = await catalog_db.reviews.aggregate([
+        {"$match": {"product_id": product_id, "is_approved": True}},
+        {"$group": {"_id": "$rating", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    
+    histogram = {star: 0 for star in range(1, 6)}
+    for bucket in buckets:
+        histogram[bucket["_id"]] = bucket["count"]
+    
+    count = sum(histogram.values())
+    average = sum(star * n for star, n in histogram.items()) / count if count else 0.0
+    return {"average": average, "count": count, "histogram": histogram}
+
+async def load_product_detail(product_id: str) -> Optional[dict]:
+    cached = product_detail_cache.get(product_id)
+    if cached and cached["expires_at"] > time.monotonic():
+        return cached["payload"]
+    
+    product, reviews, rating_summary = await asyncio.gather(
+        catalog_db.products.find_one({"id": product_id, "is_published": True}, {"_id": 0}),
+        catalog_db.reviews.find({"product_id": product_id, "is_approved": True}, {"_id": 0}).sort("created_at", -1).to_list(PRODUCT_DETAIL_REVIEWS_LIMIT),
+        get_rating_summary(product_id)
+    )
+    if not product:
+        return None
+    
+    product["created_at"] = datetime.fromisoformat(product["created_at"])
+    for review in reviews:
+        review["created_at"] = datetime.fromisoformat(review["created_at"])
+    
+    payload = {"product": product, "reviews": reviews, "rating_summary": rating_summary}
+    product_detail_cache[product_id] = {
+        "expires_at": time.monotonic() + PRODUCT_DETAIL_CACHE_TTL_SECONDS,
+        "payload": payload
+    }
+    return payload
+
+@api_router.get("/products/{product_id}/detail", response_model=ProductDetail)
+async def get_product_detail(product_id: str, request: Request, response: Response, user: Optional[dict] = Depends(get_optional_user)):
+    if user:
+        payload, order_id = await asyncio.gather(
+            load_product_detail(product_id),
+            find_entitlement(user["id"], product_id)
+        )
+    else:
+        payload, order_id = await load_product_detail(product_id), None
+    
+    if not payload:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    
+    etag = f'W/"{product_id}-{payload["product"].get("version", 0)}-{int(order_id is not None)}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = f"private, max-age={PRODUCT_DETAIL_CACHE_TTL_SECONDS}"
+    
+    return {
+        **payload,
+        "owned": order_id is not None,
+        "order_id": order_id
+    }
+
+# Related Products
+RELATED_PRODUCTS_K = int(os.environ.get('RELATED_PRODUCTS_K', '10'))
+RELATED_PRODUCTS_REBUILD_SECONDS = int(os.environ.get('RELATED_PRODUCTS_REBUILD_SECONDS', '900'))
+CO_PURCHASE_WEIGHT = float(os.environ.get('CO_PURCHASE_WEIGHT', '0.5'))
+
+RELATED_CARD_FIELDS = ["id", "title", "tagline", "price", "category", "thumbnail", "rating", "downloads"]
+RELATED_SOURCE_PROJECTION = {"_id": 0, **{field: 1 for field in RELATED_CARD_FIELDS}, "tags": 1, "tech_stack": 1}
+
+class RelatedProductsIndex:
+    """Content + co-purchase similarity over published products.
+
+    Each product is a unit-normalised bag of `category:`, `tag:` and `tech:`
+    tokens; co-purchase similarity is the cosine between product rows of the
+    product x user purchase matrix. The top-k neighbours of every product are
+    precomputed so lookups never touch Mongo.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.product_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.vocabulary: Dict[str, int] = {}
+        # Allocated on first build/upsert so importing the module does not load numpy
+        self.features = None
+        self.co_purchase = None
+        self.cards: Dict[str, dict] = {}
+        self.related: Dict[str, List[tuple]] = {}
+
+    @staticmethod
+    def tokens(product: dict) -> List[str]:
+        tokens = [f"category:{product['category'].lower()}"]
+        tokens += [f"tag:{tag.strip().lower()}" for tag in product.get("tags", [])]
+        tokens += [f"tech:{tech.strip().lower()}" for tech in product.get("tech_stack", [])]
+        return tokens
+
+    def vectorize(self, product: dict) -> "np.ndarray":
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token in self.tokens(product):
+            vector[self.vocabulary[token]] = 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def top_k(self, scores: "np.ndarray", position: int) -> List[tuple]:
+        scores = scores.copy()
+        scores[position] = -np.inf
+        k = min(self.k, len(scores) - 1)
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(self.product_ids[i], float(scores[i])) for i in candidates if scores[i] > 0]
+
+    def build(self, products: List[dict], orders: List[dict]):
+        self.product_ids = [product["id"] for product in products]
+        self.positions = {product_id: i for i, product_id in enumerate(self.product_ids)}
+        for product in products:
+            for token in self.tokens(product):
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        self.features = np.zeros((len(products), len(self.vocabulary)), dtype=np.float32)
+        for i, product in enumerate(products):
+            self.features[i] = self.vectorize(product)
+
+        # Cosine over the binary product x user purchase matrix, built from co-occurring
+        # pairs so memory scales with products and purchases, never with the number of buyers
+        baskets: Dict[str, set] = {}
+        for order in orders:
+            product_ids = [item["product_id"] for item in order.get("items", [])] or [order.get("product_id")]
+            for product_id in product_ids:
+                if product_id in self.positions:
+                    baskets.setdefault(order["user_id"], set()).add(self.positions[product_id])
+        buyers = np.zeros(len(products), dtype=np.float32)
+        pairs: Counter = Counter()
+        for basket in baskets.values():
+            positions = sorted(basket)
+            buyers[positions] += 1
+            pairs.update(combinations(positions, 2))
+        
+        self.co_purchase = np.zeros((len(products), len(products)), dtype=np.float32)
+        np.fill_diagonal(self.co_purchase, (buyers > 0).astype(np.float32))
+        if pairs:
+            rows, cols = (np.array(axis) for axis in zip(*pairs.keys()))
+            values = np.fromiter(pairs.values(), dtype=np.float32, count=len(pairs)) / np.sqrt(buyers[rows] * buyers[cols])
+            self.co_purchase[rows, cols] = values
+            self.co_purchase[cols, rows] = values
+
+        scores = self.features @ self.features.T + CO_PURCHASE_WEIGHT * self.co_purchase
+        self.cards = {product["id"]: {field: product.get(field) for field in RELATED_CARD_FIELDS} for product in products}
+        self.related = {product_id: self.top_k(scores[i], i) for i, product_id in enumerate(self.product_ids)}
+
+    def upsert(self, product: dict):
+        if not product.get("is_published", True):
+            self.remove(product["id"])
+            return
+
+        for token in self.tokens(product):
+            self.vocabulary.setdefault(token, len(self.vocabulary))
+        if self.features is None:
+            self.features = np.zeros((0, 0), dtype=np.float32)
+            self.co_purchase = np.zeros((0, 0), dtype=np.float32)
+        if self.features.shape[1] < len(self.vocabulary):
+            self.features = np.pad(self.features, ((0, 0), (0, len(self.vocabulary) - self.features.shape[1])))
+
+        product_id = product["id"]
+        if product_id not in self.positions:
+            self.positions[product_id] = len(self.product_ids)
+            self.product_ids.append(product_id)
+            self.features = np.vstack([self.features, np.zeros((1, self.features.shape[1]), dtype=np.float32)])
+            self.co_purchase = np.pad(self.co_purchase, ((0, 1), (0, 1)))
+
+        position = self.positions[product_id]
+        self.features[position] = self.vectorize(product)
+        self.cards[product_id] = {field: product.get(field) for field in RELATED_CARD_FIELDS}
+
+        scores = self.features @ self.features[position] + CO_PURCHASE_WEIGHT * self.co_purchase[position]
+        self.related[product_id] = self.top_k(scores, position)
+
+        # Patch neighbour lists in place; exact ordering is restored on the next rebuild
+        for other_id, other_position in self.positions.items():
+            if other_id == product_id:
+                continue
+            neighbours = [entry for entry in self.related.get(other_id, []) if entry[0] != product_id]
+            score = float(scores[other_position])
+            if score > 0:
+                neighbours.append((product_id, score))
+                neighbours.sort(key=lambda entry: entry[1], reverse=True)
+            self.related[other_id] = neighbours[:self.k]
+
+    def remove(self, product_id: str):
+        position = self.positions.pop(product_id, None)
+        if position is None:
+            return
+        self.product_ids.pop(position)
+        self.features = np.delete(self.features, position, axis=0)
+        self.co_purchase = np.delete(np.delete(self.co_purchase, position, axis=0), position, axis=1)
+        self.positions = {pid: i for i, pid in enumerate(self.product_ids)}
+        self.cards.pop(product_id, None)
+        self.related.pop(product_id, None)
+        for other_id, neighbours in self.related.items():
+            self.related[other_id] = [entry for entry in neighbours if entry[0] != product_id]
+
+    def lookup(self, product_id: str, limit: int) -> List[dict]:
+        return [{**self.cards[pid], "score": score} for pid, score in self.related.get(product_id, [])[:limit] if pid in self.cards]
+
+related_index = RelatedProductsIndex(RELATED_PRODUCTS_K)
+related_index_lock = asyncio.Lock()
+
+async def rebuild_related_index():
+    async with related_index_lock:
+        products = await analytics_db.products.find({"is_published": True}, RELATED_SOURCE_PROJECTION).to_list(None)
+        orders = await analytics_db.orders.find({"status": "completed"}, {"_id": 0, "user_id": 1, "product_id": 1, "items.product_id": 1}).to_list(None)
+        fresh = RelatedProductsIndex(RELATED_PRODUCTS_K)
+        await asyncio.to_thread(fresh.build, products, orders)
+        # Swap in one step so readers never see a half-built index
+        related_index.__dict__.update(fresh.__dict__)
+    logger.info(f"Related products index rebuilt for {len(products)} products")
+
+async def related_index_rebuild_loop():
+    while True:
+        try:
+            await rebuild_related_index()
+        except Exception:
+            logger.exception("Related products index rebuild failed")
+        await asyncio.sleep(RELATED_PRODUCTS_REBUILD_SECONDS)
+
+async def refresh_related_product(product_id: str):
+    product = await db.products.find_one({"id": product_id}, {**RELATED_SOURCE_PROJECTION, "is_published": 1})
+    async with related_index_lock:
+        if product:
+            related_index.upsert(product)
+        else:
+            related_index.remove(product_id)
+
+@api_router.get("/products/{product_id}/related", response_model=List[RelatedProduct])
+async def get_related_products(product_id: str, limit: int = Query(default=4, ge=1, le=RELATED_PRODUCTS_K)):
+    return related_index.lookup(product_id, limit)
+
+# Leaderboards
+LEADERBOARD_RECONCILE_SECONDS = int(os.environ.get('LEADERBOARD_RECONCILE_SECONDS', '300'))
+LEADERBOARD_METRICS = ["downloads", "revenue", "rating"]
+LEADERBOARD_SORTS = {"popular": "downloads", "rating": "rating"}
+
+class Leaderboard:
+    """Scores kept in a list sorted by (-score, product_id) so top-N is a slice."""
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self.ranking: List[tuple] = []
+
+    def set(self, product_id: str, score: float):
+        self.remove(product_id)
+        self.scores[product_id] = score
+        bisect.insort(self.ranking, (-score, product_id))
+
+    def increment(self, product_id: str, delta: float):
+        self.set(product_id, self.scores.get(product_id, 0) + delta)
+
+    def remove(self, product_id: str):
+        score = self.scores.pop(product_id, None)
+        if score is None:
+            return
+        position = bisect.bisect_left(self.ranking, (-score, product_id))
+        del self.ranking[position]
+
+class ProductLeaderboards:
+    """Global and per-category leaderboards for each metric in LEADERBOARD_METRICS."""
+
+    def __init__(self):
+        self.ready = False
+        self.categories: Dict[str, str] = {}
+        self.published: Dict[str, bool] = {}
+        self.boards: Dict[tuple, Leaderboard] = {}
+
+    def board(self, metric: str, category: Optional[str] = None) -> Leaderboard:
+        # Creates missing boards, so only writers call it; readers see categories from request input
+        return self.boards.setdefault((metric, category), Leaderboard())
+
+    def discard(self, metric: str, category: Optional[str], product_id: str):
+        board = self.boards.get((metric, category))
+        if board is not None:
+            board.remove(product_id)
+
+    def upsert_product(self, product: dict):
+        previous_category = self.categories.get(product["id"])
+        if previous_category is not None and previous_category != product["category"]:
+            for metric in LEADERBOARD_METRICS:
+                score = self.board(metric).scores.get(product["id"], 0)
+                self.discard(metric, previous_category, product["id"])
+                self.board(metric, product["category"]).set(product["id"], score)
+        self.categories[product["id"]] = product["category"]
+        self.published[product["id"]] = product.get("is_published", True)
+        for metric in ["downloads", "rating"]:
+            if metric in product:
+                self.set(product["id"], metric, product[metric])
+        if product["id"] not in self.board("revenue").scores:
+            self.set(product["id"], "revenue", 0.0)
+
+    def remove_product(self, product_id: str):
+        category = self.categories.pop(product_id, None)
+        self.published.pop(product_id, None)
+        for metric in LEADERBOARD_METRICS:
+            self.discard(metric, None, product_id)
+            if category is not None:
+                self.discard(metric, category, product_id)
+
+    def set(self, product_id: str, metric: str, score: float):
+        if product_id not in self.categories:
+            return
+        self.board(metric).set(product_id, score)
+        self.board(metric, self.categories[product_id]).set(product_id, score)
+
+    def increment(self, product_id: str, metric: str, delta: float):
+        if product_id not in self.categories:
+            return
+        self.board(metric).increment(product_id, delta)
+        self.board(metric, self.categories[product_id]).increment(product_id, delta)
+
+    def top(self, metric: str, n: int, category: Optional[str] = None, published_only: bool = True) -> List[tuple]:
+        board = self.boards.get((metric, category))
+        if board is None:
+            return []
+        entries = []
+        for negative_score, product_id in board.ranking:
+            if len(entries) == n:
+                break
+            if published_only and not self.published.get(product_id):
+                continue
+            entries.append((product_id, -negative_score))
+        return entries
+
+leaderboards = ProductLeaderboards()
+
+async def reconcile_leaderboards():
+    products = await analytics_db.products.find(
+        {}, {"_id": 0, "id": 1, "category": 1, "is_published": 1, "downloads": 1, "rating": 1}
+    ).to_list(None)
+    revenue = await analytics_db.orders.aggregate([
+        {"$match": {"status": "completed"}},
+        {"$project": {"lines": {"$ifNull": ["$items", [{"product_id": "$product_id", "amount": "$amount"}]]}}},
+        {"$unwind": "$lines"},
+        {"$group": {"_id": "$lines.product_id", "revenue": {"$sum": "$lines.amount"}}}
+    ]).to_list(None)
+    
+    fresh = ProductLeaderboards()
+    for product in products:
+        fresh.upsert_product({"downloads": 0, "rating": 0.0, **product})
+    for entry in revenue:
+        fresh.set(entry["_id"], "revenue", entry["revenue"])
+    fresh.ready = True
+    
+    # Swap in one step so incremental updates never land on a half-built board
+    leaderboards.__dict__.update(fresh.__dict__)
+    logger.info(f"Leaderboards reconciled for {len(products)} products")
+
+async def leaderboard_reconcile_loop():
+    while True:
+        try:
+            await reconcile_leaderboards()
+        except Exception:
+            logger.exception("Leaderboard reconciliation failed")
+        await asyncio.sleep(LEADERBOARD_RECONCILE_SECONDS)
+
+def record_product_purchase(product_id: str, amount: float):
+    leaderboards.increment(product_id, "downloads", 1)
+    leaderboards.increment(product_id, "revenue", amount)
+    suggestion_index.increment_downloads(product_id)
+
 # Admin Product Routes
 @api_router.post("/admin/products", response_model=Product)
 async def create_product(product_data: ProductCreate, admin: dict = Depends(get_admin_user)):
@@ -305,11 +1286,18 @@ async def create_product(product_data: ProductCreate, admin: dict = Depends(get_
         "downloads": 0,
         "rating": 0.0,
         "reviews_count": 0,
+        "version": 1,
         "file_path": None,
         "created_at": datetime.now(timezone.utc).isoformat()
     })
     
     await db.products.insert_one(product_dict)
+    # No version to bump yet, but cached catalog listings must pick the new product up
+    invalidate_product_detail(product_dict["id"])
+    await refresh_related_product(product_dict["id"])
+    await refresh_suggestions(product_dict["id"])
+    leaderboards.upsert_product(product_dict)
+    publish_product_changed(product_dict["id"], "created")
     product_dict["created_at"] = datetime.fromisoformat(product_dict["created_at"])
     
     return Product(**product_dict)
@@ -318,13 +1306,19 @@ async def create_product(product_data: ProductCreate, admin: dict = Depends(get_
 async def update_product(product_id: str, product_data: ProductCreate, admin: dict = Depends(get_admin_user)):
     result = await db.products.update_one(
         {"id": product_id},
-        {"$set": product_data.model_dump()}
+        {"$set": product_data.model_dump(), "$inc": {"version": 1}}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
+    invalidate_product_detail(product_id)
+    await refresh_related_product(product_id)
+    await refresh_suggestions(product_id)
+    
     product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    leaderboards.upsert_product(product)
+    publish_product_changed(product_id, "updated")
     product["created_at"] = datetime.fromisoformat(product["created_at"])
     return Product(**product)
 
@@ -333,60 +1327,708 @@ async def delete_product(product_id: str, admin: dict = Depends(get_admin_user))
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    await db.product_versions.update_many({"product_id": product_id}, {"$set": {"retained": False}})
+    entitlement_cache.set_file_path(product_id, None)
+    invalidate_product_detail(product_id)
+    await refresh_related_product(product_id)
+    await refresh_suggestions(product_id)
+    leaderboards.remove_product(product_id)
+    publish_product_changed(product_id, "deleted")
     return {"message": "Product deleted successfully"}
 
+# Product Files
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+PRODUCT_FILE_VERSIONS_RETAINED = int(os.environ.get('PRODUCT_FILE_VERSIONS_RETAINED', '3'))
+FILE_GC_INTERVAL_SECONDS = int(os.environ.get('FILE_GC_INTERVAL_SECONDS', '3600'))
+FILE_GC_GRACE_SECONDS = int(os.environ.get('FILE_GC_GRACE_SECONDS', '86400'))
+
+async def iter_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    await file.seek(0)
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        yield chunk
+
+def content_addressed_path(content_hash: str) -> str:
+    return f"products/objects/{content_hash[:2]}/{content_hash}.zip"
+
+async def register_file_object(path: str, content_hash: Optional[str], size: Optional[int]):
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        await db.file_objects.update_one(
+            {"path": path},
+            {
+                "$setOnInsert": {"path": path, "hash": content_hash, "size": size, "created_at": now},
+                "$set": {"last_used_at": now}
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # A concurrent upload of the same bytes registered it first
+        pass
+
 @api_router.post("/admin/products/{product_id}/upload")
 async def upload_product_file(product_id: str, file: UploadFile = File(...), admin: dict = Depends(get_admin_user)):
     if not file.filename.endswith('.zip'):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only ZIP files allowed")
     
-    file_content = await file.read()
-    file_path = f"products/{product_id}/{file.filename}"
+    product = await db.products.find_one({"id": product_id}, {"_id": 0, "file_path": 1, "file_hash": 1})
+    if not product:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
-    async with httpx.AsyncClient() as client:
-        upload_response = await client.post(
-            f"{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{file_path}",
-            headers={
-                "Authorization": f"Bearer {SUPABASE_KEY}",
-                "Content-Type": "application/zip"
-            },
-            content=file_content,
-            timeout=30.0
-        )
-        
-        if upload_response.status_code not in [200, 201]:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="File upload failed")
+    digest = hashlib.sha256()
+    size = 0
+    async for chunk in iter_upload(file):
+        digest.update(chunk)
+        size += len(chunk)
+    content_hash = digest.hexdigest()
+    file_path = content_addressed_path(content_hash)
+    
+    if product.get("file_hash") == content_hash:
+        return {"message": "File unchanged", "file_path": file_path, "deduplicated": True}
+    
+    # Stamping the object keeps it inside the collector's grace period until the product points at it
+    deduplicated = await db.file_objects.find_one_and_update(
+        {"hash": content_hash, "gc_deleting": {"$ne": True}},
+        {"$set": {"last_used_at": datetime.now(timezone.utc).isoformat()}, "$unset": {"gc_pending": ""}},
+        projection={"_id": 1}
+    ) is not None
+    if not deduplicated:
+        if await db.file_objects.find_one({"hash": content_hash, "gc_deleting": True}, {"_id": 1}):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="An identical file is being cleaned up, retry shortly",
+                headers={"Retry-After": "5"}
+            )
+        await upload_to_storage(SUPABASE_BUCKET, file_path, iter_upload(file), "application/zip", upsert=True, content_length=size)
+        await register_file_object(file_path, content_hash, size)
+    
+    previous_path = product.get("file_path")
+    if previous_path and not previous_path.startswith("products/objects/"):
+        # Pre content-addressing upload; track it so the collector can remove it
+        await register_file_object(previous_path, None, None)
     
-    await db.products.update_one(
+    updated = await db.products.find_one_and_update(
         {"id": product_id},
-        {"$set": {"file_path": file_path}}
+        {"$set": {"file_path": file_path, "file_hash": content_hash}, "$inc": {"version": 1, "file_version": 1}},
+        projection={"_id": 0, "file_version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    file_version = updated["file_version"]
+    
+    await db.product_versions.insert_one({
+        "id": str(uuid.uuid4()),
+        "product_id": product_id,
+        "file_version": file_version,
+        "file_path": file_path,
+        "file_hash": content_hash,
+        "file_name": file.filename,
+        "size": size,
+        "retained": True,
+        "uploaded_by": admin["id"],
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    await db.product_versions.update_many(
+        {"product_id": product_id, "file_version": {"$lte": file_version - PRODUCT_FILE_VERSIONS_RETAINED}},
+        {"$set": {"retained": False}}
+    )
+    entitlement_cache.set_file_path(product_id, file_path)
+    invalidate_product_detail(product_id)
+    publish_product_changed(product_id, "file_uploaded")
+    
+    return {
+        "message": "File uploaded successfully",
+        "file_path": file_path,
+        "file_version": file_version,
+        "deduplicated": deduplicated
+    }
+
+@api_router.get("/admin/products/{product_id}/versions")
+async def get_product_versions(product_id: str, admin: dict = Depends(get_admin_user)):
+    return await db.product_versions.find({"product_id": product_id}, {"_id": 0}).sort("file_version", -1).to_list(100)
+
+async def referenced_file_paths(paths: Optional[List[str]] = None) -> set:
+    query = {"file_path": {"$in": paths}} if paths is not None else {}
+    referenced = set(await db.products.distinct("file_path", query))
+    referenced.update(await db.product_versions.distinct("file_path", {**query, "retained": True}))
+    return referenced
+
+async def collect_orphaned_files() -> int:
+    """Delete stored files nothing references, without racing uploads that dedupe onto them.
+
+    Only objects neither created nor deduplicated onto within the grace period
+    are candidates. They are marked gc_pending, re-checked for references, then
+    claimed with gc_deleting only if still marked and still stale, so an upload
+    that stamped last_used_at at any point before the claim keeps its object.
+    Uploads never dedupe onto claimed objects.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=FILE_GC_GRACE_SECONDS)).isoformat()
+    stale = {
+        "created_at": {"$lt": cutoff},
+        "$or": [{"last_used_at": {"$exists": False}}, {"last_used_at": {"$lt": cutoff}}]
+    }
+    referenced = await referenced_file_paths()
+    
+    candidates = await db.file_objects.find(stale, {"_id": 0, "path": 1}).to_list(None)
+    orphaned = [candidate["path"] for candidate in candidates if candidate["path"] not in referenced]
+    if not orphaned:
+        return 0
+    
+    mark = str(uuid.uuid4())
+    await db.file_objects.update_many({"path": {"$in": orphaned}}, {"$set": {"gc_pending": mark}})
+    
+    # An upload may have pointed a product at one of these between the snapshot and the mark
+    still_referenced = await referenced_file_paths(orphaned)
+    if still_referenced:
+        await db.file_objects.update_many({"path": {"$in": list(still_referenced)}, "gc_pending": mark}, {"$unset": {"gc_pending": ""}})
+    
+    await db.file_objects.update_many(
+        {"path": {"$in": orphaned}, "gc_pending": mark, **stale},
+        {"$set": {"gc_deleting": True}}
+    )
+    doomed = await db.file_objects.distinct("path", {"path": {"$in": orphaned}, "gc_pending": mark, "gc_deleting": True})
+    if not doomed:
+        return 0
+    
+    await delete_from_storage(SUPABASE_BUCKET, doomed)
+    await db.file_objects.delete_many({"path": {"$in": doomed}, "gc_deleting": True})
+    return len(doomed)
+
+async def file_gc_loop():
+    while True:
+        await asyncio.sleep(FILE_GC_INTERVAL_SECONDS)
+        try:
+            removed = await collect_orphaned_files()
+            if removed:
+                logger.info(f"Removed {removed} orphaned product files")
+        except Exception:
+            logger.exception("Product file garbage collection failed")
+
+# Product Images
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+IMAGE_VARIANT_WIDTHS = {"card": 400, "detail": 1200, "retina": 2400}
+image_formats: Optional[Dict[str, tuple]] = None
+image_pool: Optional[ProcessPoolExecutor] = None
+
+def get_image_formats() -> Dict[str, tuple]:
+    global image_formats
+    if image_formats is None:
+        image_formats = {"webp": ("WEBP", "image/webp", {"quality": 80, "method": 4})}
+        if pil_features.check("avif"):
+            image_formats["avif"] = ("AVIF", "image/avif", {"quality": 60})
+    return image_formats
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global image_pool
+    if image_pool is None:
+        image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return image_pool
+
+def render_image_variants(content: bytes) -> Dict[str, Dict[str, bytes]]:
+    # Runs in the image process pool, so it must stay a picklable module-level function
+    with Image.open(io.BytesIO(content)) as source:
+        source = source.convert("RGBA" if source.mode in ("RGBA", "LA", "P") else "RGB")
+        variants = {}
+        for variant, width in IMAGE_VARIANT_WIDTHS.items():
+            resized = source.copy()
+            if resized.width > width:
+                resized = resized.resize((width, round(resized.height * width / resized.width)), Image.LANCZOS)
+            variants[variant] = {}
+            for extension, (pil_format, _, options) in get_image_formats().items():
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, **options)
+                variants[variant][extension] = buffer.getvalue()
+        return variants
+
+async def store_image_variants(content: bytes) -> Dict[str, Dict[str, str]]:
+    content_hash = hashlib.sha256(content).hexdigest()
+    existing = await db.image_assets.find_one({"hash": content_hash}, {"_id": 0})
+    if existing:
+        return existing["variants"]
+    
+    try:
+        rendered = await asyncio.get_running_loop().run_in_executor(get_image_pool(), render_image_variants, content)
+    except (Image.UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image file")
+    
+    uploads = []
+    variant_urls: Dict[str, Dict[str, str]] = {}
+    for variant, formats in rendered.items():
+        variant_urls[variant] = {}
+        for extension, data in formats.items():
+            path = f"images/{content_hash[:2]}/{content_hash}/{variant}.{extension}"
+            uploads.append(upload_to_storage(SUPABASE_IMAGE_BUCKET, path, data, get_image_formats()[extension][1], upsert=True))
+            variant_urls[variant][extension] = public_storage_url(SUPABASE_IMAGE_BUCKET, path)
+    await asyncio.gather(*uploads)
+    
+    try:
+        await db.image_assets.update_one(
+            {"hash": content_hash},
+            {"$setOnInsert": {
+                "hash": content_hash,
+                "variants": variant_urls,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # A concurrent upload of the same image registered it first; its paths are the same
+        pass
+    return variant_urls
+
+@api_router.post("/admin/products/{product_id}/images")
+async def upload_product_image(
+    product_id: str,
+    role: str = Query(default="thumbnail", pattern="^(thumbnail|gallery)$"),
+    file: UploadFile = File(...),
+    admin: dict = Depends(get_admin_user)
+):
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only image files allowed")
+    
+    content = await file.read()
+    if len(content) > IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image too large")
+    
+    product = await db.products.find_one({"id": product_id}, {"_id": 0, "id": 1})
+    if not product:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    
+    variants = await store_image_variants(content)
+    
+    if role == "thumbnail":
+        update = {"$set": {"thumbnail": variants["card"]["webp"], "thumbnail_variants": variants}}
+    else:
+        update = {"$push": {"gallery": variants["detail"]["webp"], "gallery_variants": variants}}
+    update["$inc"] = {"version": 1}
+    
+    await db.products.update_one({"id": product_id}, update)
+    invalidate_product_detail(product_id)
+    publish_product_changed(product_id, "image_uploaded")
+    
+    return {"message": "Image uploaded successfully", "role": role, "variants": variants}
+
+# Entitlements
+ENTITLEMENT_CACHE_SIZE = int(os.environ.get('ENTITLEMENT_CACHE_SIZE', '10000'))
+# A cached "not owned" is trusted this long, so purchases completed on another instance still show up
+ENTITLEMENT_NEGATIVE_TTL_SECONDS = int(os.environ.get('ENTITLEMENT_NEGATIVE_TTL_SECONDS', '30'))
+ENTITLEMENT_FILE_PATH_TTL_SECONDS = int(os.environ.get('ENTITLEMENT_FILE_PATH_TTL_SECONDS', '300'))
+
+class EntitlementCache:
+    """Bounded LRU of each user's completed purchases, plus product file paths for download links.
+
+    `generation` moves on every grant so a load that raced a purchase does not
+    overwrite the fresher entry with its stale snapshot.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self.users: OrderedDict = OrderedDict()
+        self.file_paths: Dict[str, tuple] = {}
+        self.generation = 0
+
+    @staticmethod
+    def order_lines(order: dict) -> List[str]:
+        # Single-product orders carry product_id, cart orders list it under items
+        return [item["product_id"] for item in order["items"]] if order.get("items") else [order["product_id"]]
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self.users.get(user_id)
+        if entry is not None:
+            self.users.move_to_end(user_id)
+        return entry
+
+    def put(self, user_id: str, orders: List[dict], generation: int) -> dict:
+        entry = {"loaded_at": time.monotonic(), "products": {}, "orders": {}}
+        for order in orders:
+            self.add_order(entry, order)
+        if generation == self.generation:
+            self.users[user_id] = entry
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+        return entry
+
+    def add_order(self, entry: dict, order: dict):
+        product_ids = self.order_lines(order)
+        entry["orders"][order["id"]] = {"product_ids": product_ids, "is_cart": bool(order.get("items"))}
+        for product_id in product_ids:
+            entry["products"].setdefault(product_id, order["id"])
+
+    def grant(self, order: dict):
+        self.generation += 1
+        entry = self.users.get(order["user_id"])
+        if entry is not None:
+            self.add_order(entry, order)
+
+    def invalidate(self, user_id: str):
+        self.generation += 1
+        self.users.pop(user_id, None)
+
+    def file_path(self, product_id: str) -> tuple:
+        """Return (known, file_path); unknown or expired entries need a reload."""
+        cached = self.file_paths.get(product_id)
+        if cached is None or cached[1] <= time.monotonic():
+            return False, None
+        return True, cached[0]
+
+    def set_file_path(self, product_id: str, file_path: Optional[str]):
+        self.file_paths[product_id] = (file_path, time.monotonic() + ENTITLEMENT_FILE_PATH_TTL_SECONDS)
+
+entitlement_cache = EntitlementCache(ENTITLEMENT_CACHE_SIZE)
+
+async def load_entitlements(user_id: str) -> dict:
+    entry = entitlement_cache.get(user_id)
+    if entry is not None:
+        return entry
+    generation = entitlement_cache.generation
+    orders = await db.orders.find(
+        {"user_id": user_id, "status": "completed"},
+        {"_id": 0, "id": 1, "product_id": 1, "items.product_id": 1}
+    ).to_list(None)
+    return entitlement_cache.put(user_id, orders, generation)
+
+async def lookup_entitlements(user_id: str, found: Callable[[dict], bool]) -> dict:
+    entry = await load_entitlements(user_id)
+    if found(entry) or time.monotonic() - entry["loaded_at"] < ENTITLEMENT_NEGATIVE_TTL_SECONDS:
+        return entry
+    entitlement_cache.invalidate(user_id)
+    return await load_entitlements(user_id)
+
+async def find_entitlement(user_id: str, product_id: str) -> Optional[str]:
+    """Return the id of a completed order that includes product_id, if any"""
+    entry = await lookup_entitlements(user_id, lambda entry: product_id in entry["products"])
+    return entry["products"].get(product_id)
+
+async def get_product_file_path(product_id: str) -> Optional[str]:
+    known, file_path = entitlement_cache.file_path(product_id)
+    if not known:
+        product = await db.products.find_one({"id": product_id}, {"_id": 0, "file_path": 1})
+        file_path = product.get("file_path") if product else None
+        entitlement_cache.set_file_path(product_id, file_path)
+    return file_path
+
+# License Verification
+LICENSE_NEGATIVE_CACHE_SIZE = int(os.environ.get('LICENSE_NEGATIVE_CACHE_SIZE', '100000'))
+LICENSE_NEGATIVE_CACHE_TTL_SECONDS = int(os.environ.get('LICENSE_NEGATIVE_CACHE_TTL_SECONDS', '300'))
+# Base64 of a raw 32-byte Ed25519 private key; signed license tokens are disabled when unset
+LICENSE_SIGNING_KEY = os.environ.get('LICENSE_SIGNING_KEY')
+
+license_signing_key = Ed25519PrivateKey.from_private_bytes(base64.b64decode(LICENSE_SIGNING_KEY)) if LICENSE_SIGNING_KEY else None
+LICENSE_ORDER_PROJECTION = {"_id": 0, "id": 1, "product_id": 1, "license_key": 1, "paid_at": 1, "items.product_id": 1, "items.license_key": 1}
+
+class LicenseIndex:
+    """Active license keys held in memory, plus a bounded TTL cache of keys known to be invalid."""
+
+    def __init__(self, negative_size: int, negative_ttl_seconds: int):
+        self.active: Dict[str, dict] = {}
+        self.negative: OrderedDict = OrderedDict()
+        self.negative_size = negative_size
+        self.negative_ttl_seconds = negative_ttl_seconds
+
+    def add_order(self, order: dict):
+        lines = order.get("items") or [{"product_id": order.get("product_id"), "license_key": order.get("license_key")}]
+        for line in lines:
+            if not line.get("license_key"):
+                continue
+            self.active[line["license_key"]] = {
+                "product_id": line["product_id"],
+                "order_id": order["id"],
+                "issued_at": order.get("paid_at")
+            }
+            self.negative.pop(line["license_key"], None)
+
+    def is_known_invalid(self, license_key: str) -> bool:
+        expires_at = self.negative.get(license_key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self.negative[license_key]
+            return False
+        return True
+
+    def mark_invalid(self, license_key: str):
+        self.negative[license_key] = time.monotonic() + self.negative_ttl_seconds
+        self.negative.move_to_end(license_key)
+        while len(self.negative) > self.negative_size:
+            self.negative.popitem(last=False)
+
+license_index = LicenseIndex(LICENSE_NEGATIVE_CACHE_SIZE, LICENSE_NEGATIVE_CACHE_TTL_SECONDS)
+
+async def load_license_index():
+    count = 0
+    try:
+        async for order in analytics_db.orders.find({"status": "completed"}, LICENSE_ORDER_PROJECTION):
+            license_index.add_order(order)
+            count += 1
+    except Exception:
+        logger.exception("License index load failed; lookups fall back to Mongo")
+        return
+    logger.info(f"License index loaded from {count} orders")
+
+def handle_order_completed(order: dict):
+    license_index.add_order(order)
+    entitlement_cache.grant(order)
+    publish_admin_event("order.completed", order)
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode('ascii')
+
+def sign_license_token(license_key: str, entry: dict) -> str:
+    """Return `<payload>.<signature>`, both base64url without padding.
+
+    The payload is compact JSON ({"lic", "pid", "oid", "iat"}) and the signature
+    is Ed25519 over the encoded payload, so shipped apps can verify it offline
+    with the key from `/licenses/public-key`.
+    """
+    payload = json.dumps({
+        "lic": license_key,
+        "pid": entry["product_id"],
+        "oid": entry["order_id"],
+        "iat": entry["issued_at"]
+    }, separators=(",", ":"), sort_keys=True).encode('utf-8')
+    encoded_payload = b64url(payload)
+    return f"{encoded_payload}.{b64url(license_signing_key.sign(encoded_payload.encode('ascii')))}"
+
+@api_router.post("/licenses/verify")
+async def verify_license(verification: LicenseVerification):
+    license_key = verification.license_key
+    entry = license_index.active.get(license_key)
+    
+    if entry is None:
+        if license_index.is_known_invalid(license_key):
+            return {"valid": False}
+        order = await db.orders.find_one(
+            {"status": "completed", "$or": [{"license_key": license_key}, {"items.license_key": license_key}]},
+            LICENSE_ORDER_PROJECTION
+        )
+        if not order:
+            license_index.mark_invalid(license_key)
+            return {"valid": False}
+        license_index.add_order(order)
+        entry = license_index.active[license_key]
+    
+    if verification.product_id and verification.product_id != entry["product_id"]:
+        return {"valid": False}
+    
+    response = {"valid": True, "product_id": entry["product_id"], "issued_at": entry["issued_at"]}
+    if license_signing_key:
+        response["token"] = sign_license_token(license_key, entry)
+    return response
+
+@api_router.get("/licenses/public-key")
+async def get_license_public_key():
+    if not license_signing_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Signed licenses are not enabled")
+    public_key = license_signing_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    return {"algorithm": "Ed25519", "public_key": base64.b64encode(public_key).decode('ascii')}
+
+# Idempotency
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+# How long a pending key stays locked to its request; a process that dies mid-request
+# leaves the key pending, and a retry may take it over once the lease has lapsed
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', str(int(REQUEST_DEADLINE_SECONDS * 2))))
+
+# Futures for requests currently executing in this process, keyed like idempotency_keys.key
+idempotency_in_flight: Dict[str, asyncio.Future] = {}
+
+async def run_idempotent(idempotency_key: Optional[str], scope: str, payload: dict, handler: Callable[[], Awaitable[Any]]):
+    """Run `handler` once per (scope, Idempotency-Key) and replay its stored response afterwards.
+
+    `scope` should include the caller's id so keys never collide across users;
+    `payload` is fingerprinted to reject a key reused with different parameters.
+    Successful and 4xx responses are stored; 5xx and unexpected errors release
+    the key so the client can retry. Pending keys are leased for
+    IDEMPOTENCY_LEASE_SECONDS and can be taken over after the lease lapses.
+    """
+    if not idempotency_key:
+        return await handler()
+    
+    key = f"{scope}:{idempotency_key}"
+    fingerprint = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    
+    in_flight = idempotency_in_flight.get(key)
+    if in_flight is not None:
+        await asyncio.shield(in_flight)
+    
+    now = datetime.now(timezone.utc)
+    lease_id = str(uuid.uuid4())
+    locked_until = now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+    try:
+        await db.idempotency_keys.insert_one({
+            "key": key,
+            "fingerprint": fingerprint,
+            "state": "pending",
+            "lease_id": lease_id,
+            "locked_until": locked_until,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+        })
+    except DuplicateKeyError:
+        record = await db.idempotency_keys.find_one({"key": key}, {"_id": 0})
+        if record and record["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Idempotency-Key reused with different parameters")
+        if record and record["state"] == "completed":
+            return JSONResponse(record["response"], status_code=record["status_code"], headers={"Idempotent-Replayed": "true"})
+        # Still pending: take the key over only if its owner's lease has lapsed
+        taken = await db.idempotency_keys.find_one_and_update(
+            {"key": key, "state": "pending", "locked_until": {"$lte": now}},
+            {"$set": {"lease_id": lease_id, "locked_until": locked_until}}
+        ) if record else None
+        if not taken:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is already in progress",
+                headers={"Retry-After": str(IDEMPOTENCY_LEASE_SECONDS)}
+            )
+        logger.warning(f"Took over idempotency key {key} after its lease expired")
+    
+    future = asyncio.get_running_loop().create_future()
+    idempotency_in_flight[key] = future
+    stored = False
+    
+    async def store(status_code: int, response: Any):
+        nonlocal stored
+        await db.idempotency_keys.update_one(
+            {"key": key, "lease_id": lease_id},
+            {"$set": {"state": "completed", "status_code": status_code, "response": response}, "$unset": {"locked_until": ""}}
+        )
+        stored = True
+    
+    try:
+        try:
+            result = await handler()
+        except HTTPException as exc:
+            if exc.status_code < 500:
+                await store(exc.status_code, {"detail": exc.detail})
+            raise
+        await store(status.HTTP_200_OK, jsonable_encoder(result))
+        return result
+    finally:
+        if not stored:
+            await db.idempotency_keys.delete_one({"key": key, "state": "pending", "lease_id": lease_id})
+        idempotency_in_flight.pop(key, None)
+        future.set_result(None)
+
+# Pending Orders
+PENDING_ORDER_TTL_SECONDS = int(os.environ.get('PENDING_ORDER_TTL_SECONDS', '3600'))
+PENDING_ORDER_SWEEP_SECONDS = int(os.environ.get('PENDING_ORDER_SWEEP_SECONDS', '300'))
+EXPIRED_ORDER_RETENTION_SECONDS = int(os.environ.get('EXPIRED_ORDER_RETENTION_SECONDS', str(7 * 86400)))
+
+async def reserve_coupon_use(code: str):
+    reserved = await db.coupons.find_one_and_update(
+        {"code": code, "$or": [{"max_uses": None}, {"$expr": {"$lt": ["$uses", "$max_uses"]}}]},
+        {"$inc": {"uses": 1}}
     )
+    if not reserved:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Coupon usage limit reached")
+
+async def release_coupon_uses(code: str, count: int = 1):
+    await db.coupons.update_one({"code": code, "uses": {"$gte": count}}, {"$inc": {"uses": -count}})
+
+async def expire_pending_orders() -> int:
+    now = datetime.now(timezone.utc)
+    expired = await db.orders.find(
+        {"status": "pending", "expires_at": {"$lt": now.isoformat()}},
+        {"_id": 0, "id": 1, "coupon_code": 1, "coupon_reserved": 1}
+    ).to_list(1000)
     
-    return {"message": "File uploaded successfully", "file_path": file_path}
+    released: Dict[str, int] = {}
+    count = 0
+    for order in expired:
+        # Filter on status again so an order verified meanwhile is left alone
+        result = await db.orders.update_one(
+            {"id": order["id"], "status": "pending"},
+            {"$set": {"status": "expired", "expired_at": now}}
+        )
+        if result.modified_count == 0:
+            continue
+        count += 1
+        if order.get("coupon_reserved"):
+            released[order["coupon_code"]] = released.get(order["coupon_code"], 0) + 1
+    
+    for code, uses in released.items():
+        await release_coupon_uses(code, uses)
+    return count
+
+async def pending_order_sweep_loop():
+    while True:
+        await asyncio.sleep(PENDING_ORDER_SWEEP_SECONDS)
+        try:
+            expired = await expire_pending_orders()
+            if expired:
+                logger.info(f"Expired {expired} abandoned pending orders")
+        except Exception:
+            logger.exception("Pending order sweep failed")
 
 # Order Routes
+async def apply_coupon(coupon_code: Optional[str], amount: float) -> tuple:
+    if not coupon_code:
+        return amount, False
+    
+    coupon = await db.coupons.find_one({"code": coupon_code, "is_active": True}, {"_id": 0})
+    if not coupon:
+        return amount, False
+    
+    if coupon.get("expires_at") and datetime.fromisoformat(coupon["expires_at"]) < datetime.now(timezone.utc):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Coupon expired")
+    if amount < coupon.get("min_purchase", 0):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Minimum purchase not met")
+    
+    if coupon["discount_type"] == "flat":
+        amount -= coupon["discount_value"]
+    else:
+        amount -= (amount * coupon["discount_value"] / 100)
+    
+    return max(0, amount), True
+
+async def fulfil_order_items(items: List[dict]):
+    await db.products.bulk_write(
+        [UpdateOne({"id": item["product_id"]}, {"$inc": {"downloads": 1}}) for item in items],
+        ordered=False
+    )
+    for item in items:
+        record_product_purchase(item["product_id"], item["amount"])
+
 @api_router.post("/orders/create")
-async def create_order(product_id: str, coupon_code: Optional[str] = None, user: dict = Depends(get_current_user)):
+async def create_order(
+    product_id: str,
+    coupon_code: Optional[str] = None,
+    user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None)
+):
+    return await run_idempotent(
+        idempotency_key,
+        f"orders/create:{user['id']}",
+        {"product_id": product_id, "coupon_code": coupon_code},
+        lambda: place_order(product_id, coupon_code, user)
+    )
+
+async def place_order(product_id: str, coupon_code: Optional[str], user: dict) -> dict:
     product = await db.products.find_one({"id": product_id, "is_published": True}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
-    amount = product["price"]
+    amount, coupon_applied = await apply_coupon(coupon_code, product["price"])
     
-    if coupon_code:
-        coupon = await db.coupons.find_one({"code": coupon_code, "is_active": True}, {"_id": 0})
-        if coupon:
-            if coupon.get("expires_at") and datetime.fromisoformat(coupon["expires_at"]) < datetime.now(timezone.utc):
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Coupon expired")
-            if amount < coupon.get("min_purchase", 0):
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Minimum purchase not met")
-            
-            if coupon["discount_type"] == "flat":
-                amount -= coupon["discount_value"]
-            else:
-                amount -= (amount * coupon["discount_value"] / 100)
-            
-            amount = max(0, amount)
+    if amount > 0:
+        pending = await db.orders.find_one({
+            "user_id": user["id"],
+            "product_id": product_id,
+            "coupon_code": coupon_code,
+            "amount": amount,
+            "status": "pending",
+            "expires_at": {"$gt": datetime.now(timezone.utc).isoformat()}
+        }, {"_id": 0})
+        if pending:
+            return {
+                "order_id": pending["id"],
+                "razorpay_order_id": pending["razorpay_order_id"],
+                "amount": amount,
+                "razorpay_key": RAZORPAY_KEY_ID
+            }
+    
+    if coupon_applied:
+        await reserve_coupon_use(coupon_code)
     
     if amount == 0:
         order_dict = {
@@ -405,15 +2047,23 @@ async def create_order(product_id: str, coupon_code: Optional[str] = None, user:
         
         await db.orders.insert_one(order_dict)
         await db.products.update_one({"id": product_id}, {"$inc": {"downloads": 1}})
+        record_product_purchase(product_id, 0)
+        handle_order_completed(order_dict)
         
         return {"order_id": order_dict["id"], "is_free": True}
     
-    razorpay_order = razorpay_client.order.create({
-        "amount": int(amount * 100),
-        "currency": "INR",
-        "payment_capture": 1
-    })
+    try:
+        razorpay_order = await create_razorpay_order({
+            "amount": int(amount * 100),
+            "currency": "INR",
+            "payment_capture": 1
+        })
+    except Exception:
+        if coupon_applied:
+            await release_coupon_uses(coupon_code)
+        raise
     
+    now = datetime.now(timezone.utc)
     order_dict = {
         "id": str(uuid.uuid4()),
         "product_id": product_id,
@@ -424,8 +2074,10 @@ async def create_order(product_id: str, coupon_code: Optional[str] = None, user:
         "razorpay_payment_id": None,
         "status": "pending",
         "license_key": None,
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "paid_at": None
+        "coupon_reserved": coupon_applied,
+        "created_at": now.isoformat(),
+        "paid_at": None,
+        "expires_at": (now + timedelta(seconds=PENDING_ORDER_TTL_SECONDS)).isoformat()
     }
     
     await db.orders.insert_one(order_dict)
@@ -434,36 +2086,183 @@ async def create_order(product_id: str, coupon_code: Optional[str] = None, user:
         "order_id": order_dict["id"],
         "razorpay_order_id": razorpay_order["id"],
         "amount": amount,
-        "razorpay_key": os.environ['RAZORPAY_KEY_ID']
+        "razorpay_key": RAZORPAY_KEY_ID
     }
 
-@api_router.post("/orders/verify")
-async def verify_payment(verification: PaymentVerification, user: dict = Depends(get_current_user)):
-    try:
-        razorpay_client.utility.verify_payment_signature(verification.model_dump())
-        
-        order = await db.orders.find_one({"razorpay_order_id": verification.razorpay_order_id}, {"_id": 0})
-        if not order:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-        
-        license_key = str(uuid.uuid4())
-        
-        await db.orders.update_one(
-            {"id": order["id"]},
-            {"$set": {
-                "razorpay_payment_id": verification.razorpay_payment_id,
-                "status": "completed",
-                "license_key": license_key,
-                "paid_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        await db.products.update_one({"id": order["product_id"]}, {"$inc": {"downloads": 1}})
+@api_router.post("/orders/checkout")
+async def checkout_cart(
+    cart: CartCheckout,
+    user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None)
+):
+    return await run_idempotent(
+        idempotency_key,
+        f"orders/checkout:{user['id']}",
+        cart.model_dump(),
+        lambda: place_cart_order(cart, user)
+    )
+
+async def place_cart_order(cart: CartCheckout, user: dict) -> dict:
+    product_ids = list(dict.fromkeys(cart.product_ids))
+    products = await db.products.find(
+        {"id": {"$in": product_ids}, "is_published": True},
+        {"_id": 0, "id": 1, "title": 1, "price": 1}
+    ).to_list(len(product_ids))
+    by_id = {product["id"]: product for product in products}
+    missing = [product_id for product_id in product_ids if product_id not in by_id]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Products not found: {', '.join(missing)}")
+    
+    subtotal = sum(product["price"] for product in products)
+    amount, coupon_applied = await apply_coupon(cart.coupon_code, subtotal)
+    
+    # Spread the cart discount over the lines so per-product revenue still sums to the order amount
+    ratio = amount / subtotal if subtotal else 0
+    items = [
+        {
+            "product_id": product_id,
+            "title": by_id[product_id]["title"],
+            "price": by_id[product_id]["price"],
+            "amount": round(by_id[product_id]["price"] * ratio, 2),
+            "license_key": None
+        }
+        for product_id in product_ids
+    ]
+    items[-1]["amount"] = round(amount - sum(item["amount"] for item in items[:-1]), 2)
+    
+    if coupon_applied:
+        await reserve_coupon_use(cart.coupon_code)
+    
+    now = datetime.now(timezone.utc)
+    if amount == 0:
+        for item in items:
+            item["license_key"] = str(uuid.uuid4())
+        order_dict = {
+            "id": str(uuid.uuid4()),
+            "product_id": None,
+            "items": items,
+            "user_id": user["id"],
+            "amount": 0,
+            "coupon_code": cart.coupon_code,
+            "razorpay_order_id": "FREE",
+            "razorpay_payment_id": "FREE",
+            "status": "completed",
+            "license_key": None,
+            "created_at": now.isoformat(),
+            "paid_at": now.isoformat()
+        }
         
-        return {"message": "Payment verified", "license_key": license_key}
+        await db.orders.insert_one(order_dict)
+        await fulfil_order_items(items)
+        handle_order_completed(order_dict)
         
+        return {"order_id": order_dict["id"], "is_free": True}
+    
+    try:
+        razorpay_order = await create_razorpay_order({
+            "amount": int(round(amount * 100)),
+            "currency": "INR",
+            "payment_capture": 1
+        })
+    except Exception:
+        if coupon_applied:
+            await release_coupon_uses(cart.coupon_code)
+        raise
+    
+    order_dict = {
+        "id": str(uuid.uuid4()),
+        "product_id": None,
+        "items": items,
+        "user_id": user["id"],
+        "amount": amount,
+        "coupon_code": cart.coupon_code,
+        "razorpay_order_id": razorpay_order["id"],
+        "razorpay_payment_id": None,
+        "status": "pending",
+        "license_key": None,
+        "coupon_reserved": coupon_applied,
+        "created_at": now.isoformat(),
+        "paid_at": None,
+        "expires_at": (now + timedelta(seconds=PENDING_ORDER_TTL_SECONDS)).isoformat()
+    }
+    
+    await db.orders.insert_one(order_dict)
+    
+    return {
+        "order_id": order_dict["id"],
+        "razorpay_order_id": razorpay_order["id"],
+        "amount": amount,
+        "razorpay_key": RAZORPAY_KEY_ID
+    }
+
+@api_router.post("/orders/verify")
+async def verify_payment(
+    verification: PaymentVerification,
+    user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None)
+):
+    return await run_idempotent(
+        idempotency_key,
+        f"orders/verify:{user['id']}",
+        verification.model_dump(),
+        lambda: complete_payment(verification, user)
+    )
+
+def payment_result(order: dict) -> dict:
+    if order.get("items"):
+        return {
+            "message": "Payment verified",
+            "licenses": {item["product_id"]: item["license_key"] for item in order["items"]}
+        }
+    return {"message": "Payment verified", "license_key": order["license_key"]}
+
+async def complete_payment(verification: PaymentVerification, user: dict) -> dict:
+    try:
+        get_razorpay_client().utility.verify_payment_signature(verification.model_dump())
     except razorpay.errors.SignatureVerificationError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid signature")
+    
+    order = await db.orders.find_one({"razorpay_order_id": verification.razorpay_order_id}, {"_id": 0})
+    if not order or order["user_id"] != user["id"]:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    if order["status"] == "completed":
+        # Replayed verification: report the licenses already issued instead of minting new ones
+        return payment_result(order)
+    
+    paid_fields = {
+        "razorpay_payment_id": verification.razorpay_payment_id,
+        "status": "completed",
+        "paid_at": datetime.now(timezone.utc).isoformat()
+    }
+    if order.get("items"):
+        paid_fields["items"] = [{**item, "license_key": str(uuid.uuid4())} for item in order["items"]]
+    else:
+        paid_fields["license_key"] = str(uuid.uuid4())
+    
+    # Conditional on status so concurrent verifications complete (and fulfil) the order exactly once
+    previous = await db.orders.find_one_and_update(
+        {"id": order["id"], "status": {"$in": ["pending", "expired"]}},
+        {"$set": paid_fields, "$unset": {"expired_at": ""}},
+        projection={"_id": 0}
+    )
+    if previous is None:
+        completed = await db.orders.find_one({"id": order["id"]}, {"_id": 0})
+        return payment_result(completed)
+    
+    if previous["status"] == "expired" and previous.get("coupon_reserved"):
+        # The sweeper released this order's coupon reservation; the late payment still consumes a use
+        await db.coupons.update_one({"code": previous["coupon_code"]}, {"$inc": {"uses": 1}})
+    
+    completed = {**previous, **paid_fields}
+    if completed.get("items"):
+        await fulfil_order_items(completed["items"])
+    else:
+        await db.products.update_one({"id": completed["product_id"]}, {"$inc": {"downloads": 1}})
+        record_product_purchase(completed["product_id"], completed["amount"])
+    completed.pop("expired_at", None)
+    handle_order_completed(completed)
+    
+    return payment_result(completed)
 
 @api_router.get("/orders/my-orders", response_model=List[Order])
 async def get_my_orders(user: dict = Depends(get_current_user)):
@@ -477,45 +2276,65 @@ async def get_my_orders(user: dict = Depends(get_current_user)):
     return orders
 
 @api_router.get("/orders/{order_id}/download")
-async def get_download_url(order_id: str, user: dict = Depends(get_current_user)):
-    order = await db.orders.find_one({"id": order_id, "user_id": user["id"], "status": "completed"}, {"_id": 0})
+async def get_download_url(order_id: str, product_id: Optional[str] = None, user: dict = Depends(get_current_user)):
+    entry = await lookup_entitlements(user["id"], lambda entry: order_id in entry["orders"])
+    order = entry["orders"].get(order_id)
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found or not completed")
     
-    product = await db.products.find_one({"id": order["product_id"]}, {"_id": 0})
-    if not product or not product.get("file_path"):
+    if order["is_cart"]:
+        if not product_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="product_id is required for multi-item orders")
+        if product_id not in order["product_ids"]:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not in this order")
+    else:
+        product_id = order["product_ids"][0]
+    
+    file_path = await get_product_file_path(product_id)
+    if not file_path:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product file not found")
     
-    async with httpx.AsyncClient() as client:
-        sign_response = await client.post(
-            f"{SUPABASE_URL}/storage/v1/object/sign/{SUPABASE_BUCKET}/{product['file_path']}",
-            headers={"Authorization": f"Bearer {SUPABASE_KEY}"},
-            json={"expiresIn": 3600},
-            timeout=10.0
-        )
-        
-        if sign_response.status_code != 200:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate download URL")
-        
-        signed_url = sign_response.json().get("signedURL")
+    async def sign(timeout: float):
+        async with httpx.AsyncClient() as client:
+            return await client.post(
+                f"{SUPABASE_URL}/storage/v1/object/sign/{SUPABASE_BUCKET}/{file_path}",
+                headers={"Authorization": f"Bearer {SUPABASE_KEY}"},
+                json={"expiresIn": 3600},
+                timeout=timeout
+            )
+    
+    sign_response = await call_dependency("supabase", sign, timeout=10.0, retries=1, hedge_after=SIGN_HEDGE_AFTER_SECONDS)
+    
+    if sign_response.status_code != 200:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate download URL")
+    
+    signed_url = sign_response.json().get("signedURL")
     
     return {"download_url": f"{SUPABASE_URL}{signed_url}", "expires_in": 3600}
 
 # Admin Analytics
 @api_router.get("/admin/analytics")
 async def get_analytics(admin: dict = Depends(get_admin_user)):
-    total_orders = await db.orders.count_documents({"status": "completed"})
+    total_orders = await analytics_db.orders.count_documents({"status": "completed"})
     
-    orders = await db.orders.find({"status": "completed"}, {"_id": 0}).to_list(10000)
+    orders = await analytics_db.orders.find({"status": "completed"}, {"_id": 0}).to_list(10000)
     total_revenue = sum(order["amount"] for order in orders)
     
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    top_products = sorted(products, key=lambda x: x.get("downloads", 0), reverse=True)[:5]
+    if leaderboards.ready:
+        total_products = await analytics_db.products.estimated_document_count()
+        top_ids = [product_id for product_id, _ in leaderboards.top("downloads", 5, published_only=False)]
+        top_products = await analytics_db.products.find({"id": {"$in": top_ids}}, {"_id": 0}).to_list(5)
+        rank = {product_id: i for i, product_id in enumerate(top_ids)}
+        top_products.sort(key=lambda product: rank[product["id"]])
+    else:
+        products = await analytics_db.products.find({}, {"_id": 0}).to_list(1000)
+        total_products = len(products)
+        top_products = sorted(products, key=lambda x: x.get("downloads", 0), reverse=True)[:5]
     
     return {
         "total_orders": total_orders,
         "total_revenue": total_revenue,
-        "total_products": len(products),
+        "total_products": total_products,
         "top_products": top_products
     }
 
@@ -530,6 +2349,142 @@ async def get_all_orders(admin: dict = Depends(get_admin_user)):
     
     return orders
 
+# Admin Events
+ADMIN_EVENTS_SOURCE = os.environ.get('ADMIN_EVENTS_SOURCE', 'local')  # "local" or "changestream"
+ADMIN_EVENTS_QUEUE_SIZE = int(os.environ.get('ADMIN_EVENTS_QUEUE_SIZE', '100'))
+ADMIN_EVENTS_HEARTBEAT_SECONDS = 15
+# Stream tokens only need to outlive the EventSource handshake; the browser fetches a fresh one to reconnect
+ADMIN_EVENTS_TOKEN_SECONDS = int(os.environ.get('ADMIN_EVENTS_TOKEN_SECONDS', '60'))
+ADMIN_EVENTS_TOKEN_PURPOSE = "admin_events"
+
+class EventSubscription:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+class EventBus:
+    """In-process fan-out with one bounded queue per subscriber.
+
+    A subscriber that falls behind loses its oldest events rather than growing
+    without bound; it is told to resync once it catches up.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers: set = set()
+
+    def subscribe(self) -> EventSubscription:
+        subscription = EventSubscription(self.queue_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, event_type: str, data: dict):
+        event = {"type": event_type, "data": jsonable_encoder({k: v for k, v in data.items() if k != "_id"})}
+        for subscription in self.subscribers:
+            if subscription.queue.full():
+                subscription.queue.get_nowait()
+                subscription.dropped += 1
+            subscription.queue.put_nowait(event)
+
+admin_events = EventBus(ADMIN_EVENTS_QUEUE_SIZE)
+
+def publish_admin_event(event_type: str, data: dict):
+    # With a change stream feeding the bus, local publishes would duplicate its events
+    if ADMIN_EVENTS_SOURCE == "local":
+        admin_events.publish(event_type, data)
+
+def publish_product_changed(product_id: str, action: str):
+    publish_admin_event("product.changed", {"id": product_id, "action": action})
+
+async def admin_change_stream_loop():
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": ["orders", "reviews", "products"]},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+    }}]
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup") as stream:
+                async for change in stream:
+                    collection = change["ns"]["coll"]
+                    document = change.get("fullDocument") or {}
+                    operation = change["operationType"]
+                    if collection == "orders" and document.get("status") == "completed":
+                        admin_events.publish("order.completed", document)
+                    elif collection == "reviews" and operation == "insert":
+                        admin_events.publish("review.submitted", document)
+                    elif collection == "reviews" and document.get("is_approved"):
+                        admin_events.publish("review.approved", {"id": document["id"], "product_id": document["product_id"]})
+                    elif collection == "products":
+                        action = "deleted" if operation == "delete" else "updated"
+                        admin_events.publish("product.changed", {"id": document.get("id"), "action": action})
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Admin change stream failed, reconnecting")
+            await asyncio.sleep(5)
+
+async def get_admin_user_for_stream(
+    stream_token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> dict:
+    if credentials:
+        return await get_admin_user(await get_current_user(credentials))
+    # EventSource cannot send headers, so browsers pass a stream token from /admin/events/token.
+    # Query strings end up in access logs, so never accept a full access token here
+    if not stream_token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    payload = decode_token(stream_token)
+    if payload.get("purpose") != ADMIN_EVENTS_TOKEN_PURPOSE:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid stream token")
+    user = await db.users.find_one({"id": payload["sub"]}, {"_id": 0})
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    return await get_admin_user(user)
+
+@api_router.post("/admin/events/token")
+async def create_admin_events_token(admin: dict = Depends(get_admin_user)):
+    token = create_token(
+        {"sub": admin["id"], "purpose": ADMIN_EVENTS_TOKEN_PURPOSE},
+        timedelta(seconds=ADMIN_EVENTS_TOKEN_SECONDS)
+    )
+    return {"token": token, "expires_in": ADMIN_EVENTS_TOKEN_SECONDS}
+
+def format_sse(event_type: str, data: Any) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+@api_router.get("/admin/events")
+async def stream_admin_events(request: Request, admin: dict = Depends(get_admin_user_for_stream)):
+    subscription = admin_events.subscribe()
+    
+    async def event_stream():
+        try:
+            yield format_sse("ready", {"source": ADMIN_EVENTS_SOURCE})
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=ADMIN_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.dropped:
+                    yield format_sse("resync", {"dropped": subscription.dropped})
+                    subscription.dropped = 0
+                yield format_sse(event["type"], event["data"])
+        finally:
+            admin_events.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/admin/dependencies")
+async def get_dependency_status(admin: dict = Depends(get_admin_user)):
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
 # Coupon Routes
 @api_router.post("/admin/coupons", response_model=Coupon)
 async def create_coupon(coupon_data: CouponBase, admin: dict = Depends(get_admin_user)):
@@ -569,8 +2524,7 @@ async def get_coupons(admin: dict = Depends(get_admin_user)):
 # Review Routes
 @api_router.post("/reviews", response_model=Review)
 async def create_review(review_data: ReviewBase, user: dict = Depends(get_current_user)):
-    order = await db.orders.find_one({"user_id": user["id"], "product_id": review_data.product_id, "status": "completed"})
-    if not order:
+    if not await find_entitlement(user["id"], review_data.product_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You must purchase this product to review")
     
     review_dict = review_data.model_dump()
@@ -583,37 +2537,80 @@ async def create_review(review_data: ReviewBase, user: dict = Depends(get_curren
     })
     
     await db.reviews.insert_one(review_dict)
+    publish_admin_event("review.submitted", review_dict)
     review_dict["created_at"] = datetime.fromisoformat(review_dict["created_at"])
     
     return Review(**review_dict)
 
 @api_router.get("/reviews/{product_id}", response_model=List[Review])
 async def get_product_reviews(product_id: str):
-    reviews = await db.reviews.find({"product_id": product_id, "is_approved": True}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    reviews = await catalog_db.reviews.find({"product_id": product_id, "is_approved": True}, {"_id": 0}).sort("created_at", -1).to_list(100)
     
     for review in reviews:
         review["created_at"] = datetime.fromisoformat(review["created_at"])
     
     return reviews
 
+async def recompute_product_ratings(product_ids: List[str]):
+    """Recompute rating and reviews_count from approved reviews, one aggregate and one bulk_write for all products"""
+    stats = {product_id: {"rating": 0.0, "reviews_count": 0} for product_id in product_ids}
+    async for row in db.reviews.aggregate([
+        {"$match": {"product_id": {"$in": product_ids}, "is_approved": True}},
+        {"$group": {"_id": "$product_id", "rating": {"$avg": "$rating"}, "reviews_count": {"$sum": 1}}}
+    ]):
+        stats[row["_id"]] = {"rating": row["rating"], "reviews_count": row["reviews_count"]}
+    
+    await db.products.bulk_write(
+        [UpdateOne({"id": product_id}, {"$set": fields, "$inc": {"version": 1}}) for product_id, fields in stats.items()],
+        ordered=False
+    )
+    for product_id, fields in stats.items():
+        invalidate_product_detail(product_id)
+        leaderboards.set(product_id, "rating", fields["rating"])
+
 @api_router.put("/admin/reviews/{review_id}/approve")
 async def approve_review(review_id: str, admin: dict = Depends(get_admin_user)):
-    result = await db.reviews.update_one({"id": review_id}, {"$set": {"is_approved": True}})
-    if result.matched_count == 0:
+    review = await db.reviews.find_one_and_update(
+        {"id": review_id},
+        {"$set": {"is_approved": True}, "$unset": {"rejected_at": ""}},
+        projection={"_id": 0, "product_id": 1}
+    )
+    if not review:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found")
     
-    review = await db.reviews.find_one({"id": review_id}, {"_id": 0})
-    
-    reviews = await db.reviews.find({"product_id": review["product_id"], "is_approved": True}, {"_id": 0}).to_list(1000)
-    if reviews:
-        avg_rating = sum(r["rating"] for r in reviews) / len(reviews)
-        await db.products.update_one(
-            {"id": review["product_id"]},
-            {"$set": {"rating": avg_rating, "reviews_count": len(reviews)}}
-        )
+    await recompute_product_ratings([review["product_id"]])
     
+    publish_admin_event("review.approved", {"id": review_id, "product_id": review["product_id"]})
     return {"message": "Review approved"}
 
+@api_router.post("/admin/reviews/moderate")
+async def moderate_reviews(moderation: ReviewModeration, admin: dict = Depends(get_admin_user)):
+    if moderation.action not in REVIEW_MODERATION_EVENTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Action must be 'approve' or 'reject'")
+    
+    review_ids = list(set(moderation.review_ids))
+    if moderation.action == "approve":
+        # Rejected reviews stay rejected unless approved one at a time
+        query = {"id": {"$in": review_ids}, "is_approved": False, "rejected_at": None}
+        update = {"$set": {"is_approved": True}}
+    else:
+        query = {"id": {"$in": review_ids}, "rejected_at": None}
+        update = {"$set": {"is_approved": False, "rejected_at": datetime.now(timezone.utc).isoformat()}}
+    
+    targets = await db.reviews.find(query, {"_id": 0, "id": 1, "product_id": 1}).to_list(len(review_ids))
+    if not targets:
+        return {"modified": 0, "products_updated": 0}
+    
+    result = await db.reviews.update_many({**query, "id": {"$in": [r["id"] for r in targets]}}, update)
+    product_ids = list({r["product_id"] for r in targets})
+    await recompute_product_ratings(product_ids)
+    
+    publish_admin_event(REVIEW_MODERATION_EVENTS[moderation.action], {
+        "ids": [r["id"] for r in targets],
+        "product_ids": product_ids
+    })
+    return {"modified": result.modified_count, "products_updated": len(product_ids)}
+
 @api_router.get("/admin/reviews", response_model=List[Review])
 async def get_all_reviews(admin: dict = Depends(get_admin_user)):
     reviews = await db.reviews.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
@@ -623,8 +2620,166 @@ async def get_all_reviews(admin: dict = Depends(get_admin_user)):
     
     return reviews
 
+# Response Compression
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+CATALOG_CACHE_TTL_SECONDS = int(os.environ.get('CATALOG_CACHE_TTL_SECONDS', '30'))
+CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '512'))
+# Anonymous catalog reads whose body does not depend on the caller
+CATALOG_CACHE_PATHS = re.compile(r"^/api/(products(/[^/]+(/related)?)?|reviews/[^/]+)$")
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def compress_body(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    # Cached payloads are compressed once and served many times, so spend more CPU on them
+    if encoding == "br":
+        return brotli.compress(body, quality=9 if cached else 4)
+    return gzip.compress(body, compresslevel=9 if cached else 6)
+
+class CatalogResponseCache:
+    """LRU of rendered catalog responses with their compressed encodings alongside."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, status_code: int, headers: List[tuple], body: bytes) -> dict:
+        entry = self.entries[key] = {
+            "status": status_code,
+            "headers": headers,
+            "body": body,
+            "encoded": {},
+            "expires_at": time.monotonic() + self.ttl_seconds
+        }
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    def encoded_body(self, entry: dict, encoding: Optional[str]) -> bytes:
+        if encoding is None or len(entry["body"]) < COMPRESSION_MIN_SIZE:
+            return entry["body"]
+        if encoding not in entry["encoded"]:
+            entry["encoded"][encoding] = compress_body(entry["body"], encoding, cached=True)
+        return entry["encoded"][encoding]
+
+    def clear(self):
+        self.entries.clear()
+
+catalog_response_cache = CatalogResponseCache(CATALOG_CACHE_MAX_ENTRIES, CATALOG_CACHE_TTL_SECONDS)
+
+class CompressionMiddleware:
+    """gzip/brotli response compression with a size threshold.
+
+    Anonymous GETs on catalog paths are answered from `catalog_response_cache`,
+    which keeps each negotiated encoding so hits are never recompressed.
+    Streaming responses (more than one body message) pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+        cache_key = None
+        if (
+            scope["method"] == "GET"
+            and "authorization" not in request_headers
+            and CATALOG_CACHE_PATHS.match(scope["path"])
+        ):
+            cache_key = f"{scope['path']}?{scope['query_string'].decode('latin-1')}"
+            entry = catalog_response_cache.get(cache_key)
+            if entry is not None:
+                await self.send_buffered(send, entry["status"], list(entry["headers"]), catalog_response_cache.encoded_body(entry, encoding), encoding, entry["body"])
+                return
+        
+        start_message = None
+        streaming = False
+        
+        async def buffered_send(message):
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+            if message.get("more_body", False):
+                streaming = True
+                await send(start_message)
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(start_message["headers"]))
+            if "content-encoding" in headers:
+                await send(start_message)
+                await send(message)
+                return
+            
+            raw_headers = [(name, value) for name, value in headers.raw if name not in (b"content-length",)]
+            if cache_key is not None and start_message["status"] == 200:
+                entry = catalog_response_cache.put(cache_key, start_message["status"], raw_headers, body)
+                await self.send_buffered(send, start_message["status"], raw_headers, catalog_response_cache.encoded_body(entry, encoding), encoding, body)
+                return
+            
+            if encoding and len(body) >= COMPRESSION_MIN_SIZE:
+                encoded = compress_body(body, encoding)
+            else:
+                encoded = body
+            await self.send_buffered(send, start_message["status"], raw_headers, encoded, encoding, body)
+        
+        await self.app(scope, receive, buffered_send)
+
+    @staticmethod
+    async def send_buffered(send, status_code: int, raw_headers: List[tuple], encoded: bytes, encoding: Optional[str], body: bytes):
+        headers = MutableHeaders(raw=list(raw_headers))
+        if encoded is not body:
+            headers["Content-Encoding"] = encoding
+        headers.add_vary_header("Accept-Encoding")
+        headers["Content-Length"] = str(len(encoded))
+        await send({"type": "http.response.start", "status": status_code, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": encoded})
+
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(DeadlineMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -636,21 +2791,110 @@ app.add_middleware(
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+background_tasks: List[asyncio.Task] = []
+
+# Startup Profiling
+# Logs how long each startup hook takes; see backend_startup_benchmark.py for import times
+STARTUP_PROFILE = os.environ.get('STARTUP_PROFILE', 'false').lower() in ('1', 'true')
+startup_timings: Dict[str, float] = {}
+
+def timed_startup(hook: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+    @functools.wraps(hook)
+    async def wrapper():
+        started = time.perf_counter()
+        try:
+            await hook()
+        finally:
+            startup_timings[hook.__name__] = (time.perf_counter() - started) * 1000
+            if STARTUP_PROFILE:
+                logger.info(f"Startup hook {hook.__name__} took {startup_timings[hook.__name__]:.1f} ms")
+    return wrapper
+
 @app.on_event("startup")
-async def startup_db():
-    admin_exists = await db.users.find_one({"email": "admin@codemart.com"})
-    if not admin_exists:
+@timed_startup
+async def ensure_indexes():
+    # One createIndexes command per collection, sent concurrently
+    await asyncio.gather(
+        db.users.create_indexes([
+            IndexModel("id", unique=True),
+            IndexModel("email", unique=True)
+        ]),
+        db.products.create_indexes([
+            IndexModel("id", unique=True),
+            IndexModel([("is_published", 1), ("created_at", -1)]),
+            IndexModel([("is_published", 1), ("category", 1), ("created_at", -1)]),
+            IndexModel([("is_published", 1), ("price", 1)]),
+            IndexModel([("is_published", 1), ("downloads", -1)]),
+            IndexModel([("is_published", 1), ("rating", -1)])
+        ]),
+        db.orders.create_indexes([
+            IndexModel("id", unique=True),
+            IndexModel([("user_id", 1), ("created_at", -1)]),
+            IndexModel([("created_at", -1)]),
+            IndexModel([("user_id", 1), ("product_id", 1), ("status", 1)]),
+            IndexModel([("user_id", 1), ("items.product_id", 1), ("status", 1)]),
+            IndexModel("razorpay_order_id"),
+            IndexModel("license_key", sparse=True),
+            IndexModel("items.license_key", sparse=True),
+            IndexModel([("status", 1), ("expires_at", 1)]),
+            IndexModel("expired_at", expireAfterSeconds=EXPIRED_ORDER_RETENTION_SECONDS)
+        ]),
+        db.reviews.create_indexes([
+            IndexModel("id", unique=True),
+            IndexModel([("product_id", 1), ("is_approved", 1), ("created_at", -1)]),
+            IndexModel([("created_at", -1)])
+        ]),
+        db.coupons.create_indexes([IndexModel("code", unique=True)]),
+        db.file_objects.create_indexes([
+            IndexModel("path", unique=True),
+            IndexModel("hash")
+        ]),
+        db.image_assets.create_indexes([IndexModel("hash", unique=True)]),
+        db.product_versions.create_indexes([IndexModel([("product_id", 1), ("file_version", -1)])]),
+        db.idempotency_keys.create_indexes([
+            IndexModel("key", unique=True),
+            IndexModel("expires_at", expireAfterSeconds=0)
+        ])
+    )
+
+async def seed_admin_user():
+    try:
+        if await db.users.find_one({"email": "admin@codemart.com"}, {"_id": 1}):
+            return
         admin_dict = {
             "id": str(uuid.uuid4()),
             "email": "admin@codemart.com",
             "name": "Admin",
-            "password": hash_password("admin123"),
+            # bcrypt is deliberately slow; keep it off the event loop
+            "password": await asyncio.to_thread(hash_password, "admin123"),
             "role": "admin",
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.users.insert_one(admin_dict)
         logger.info("Default admin user created")
+    except DuplicateKeyError:
+        pass  # Another instance seeded it first
+    except Exception:
+        logger.exception("Default admin seeding failed")
+
+@app.on_event("startup")
+@timed_startup
+async def start_background_tasks():
+    # Admin seeding is not needed to serve traffic, so it runs after the app is ready
+    background_tasks.append(asyncio.create_task(seed_admin_user()))
+    background_tasks.append(asyncio.create_task(related_index_rebuild_loop()))
+    background_tasks.append(asyncio.create_task(suggestion_index_rebuild_loop()))
+    background_tasks.append(asyncio.create_task(leaderboard_reconcile_loop()))
+    background_tasks.append(asyncio.create_task(file_gc_loop()))
+    background_tasks.append(asyncio.create_task(pending_order_sweep_loop()))
+    background_tasks.append(asyncio.create_task(load_license_index()))
+    if ADMIN_EVENTS_SOURCE == "changestream":
+        background_tasks.append(asyncio.create_task(admin_change_stream_loop()))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    if image_pool is not None:
+        image_pool.shutdown(wait=False, cancel_futures=True)
     client.close()
\ No newline at end of file
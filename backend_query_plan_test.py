@@ -0,0 +1,373 @@
+"""Query-plan regression run for the CodeMart API.
+
+Seeds a throwaway database on a local MongoDB, calls each API route in-process,
+captures every command Motor sends through a pymongo CommandListener, explains
+it with executionStats and fails on collection scans, in-memory sorts, or a
+docs-examined to docs-returned ratio above MAX_EXAMINED_RATIO.
+
+    MONGO_URL=mongodb://localhost:27017 python backend_query_plan_test.py
+
+The per-route index usage report is written to test_reports/query_plans.json.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from pymongo import monitoring
+
+ROOT_DIR = Path(__file__).parent
+REPORT_PATH = ROOT_DIR / "test_reports" / "query_plans.json"
+
+MAX_EXAMINED_RATIO = float(os.environ.get("MAX_EXAMINED_RATIO", "10"))
+# Below this many examined documents the ratio is noise, not a regression
+MIN_EXAMINED_FOR_RATIO = int(os.environ.get("MIN_EXAMINED_FOR_RATIO", "50"))
+# Seeded as an existing image asset, so the image route dedupes without touching storage
+SEED_IMAGE = b"query-plan-seed-image"
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+STRIPPED_FIELDS = {"lsid", "txnNumber", "readConcern", "writeConcern", "ordered", "bypassDocumentValidation"}
+
+# Plans we accept knowingly; every entry needs a reason
+ACCEPTED_PLANS = {
+    ("GET /products search", "products"): "Unanchored case-insensitive $regex cannot use an index",
+}
+
+# The test database is dropped on every run, so never point it at real data
+os.environ["DB_NAME"] = os.environ.get("QUERY_PLAN_DB_NAME", "codemart_query_plan")
+for name, value in {
+    "MONGO_URL": "mongodb://localhost:27017",
+    "JWT_SECRET": "query-plan-test",
+    "JWT_ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "RAZORPAY_KEY_ID": "rzp_test",
+    "RAZORPAY_KEY_SECRET": "rzp_test_secret",
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_ANON_KEY": "anon",
+    "SUPABASE_BUCKET_NAME": "products",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+class QueryCapture(monitoring.CommandListener):
+    """Records explainable commands issued while a route is being exercised."""
+
+    def __init__(self):
+        self.route = None
+        self.commands = []
+
+    def started(self, event):
+        if self.route is None or event.command_name not in EXPLAINABLE_COMMANDS:
+            return
+        command = {k: v for k, v in event.command.items() if not k.startswith("$") and k not in STRIPPED_FIELDS}
+        self.commands.append({"route": self.route, "database": event.database_name, "name": event.command_name, "command": command})
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+capture = QueryCapture()
+# Must be registered before server.py creates its Motor client
+monitoring.register(capture)
+
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+import server  # noqa: E402
+import httpx  # noqa: E402
+
+
+def walk(node, key):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == key:
+                yield v
+            yield from walk(v, key)
+    elif isinstance(node, list):
+        for item in node:
+            yield from walk(item, key)
+
+
+def split_statements(name, command):
+    """Explain only accepts single-statement writes, so split batched updates/deletes."""
+    if name not in ("update", "delete"):
+        return [command]
+    field = "updates" if name == "update" else "deletes"
+    return [{**command, field: [statement]} for statement in command[field]]
+
+
+def command_filter(name, command):
+    if name == "find":
+        return command.get("filter", {})
+    if name in ("count", "distinct", "findAndModify"):
+        return command.get("query", {})
+    if name == "update":
+        return command["updates"][0]["q"]
+    if name == "delete":
+        return command["deletes"][0]["q"]
+    pipeline = command.get("pipeline", [])
+    return pipeline[0]["$match"] if pipeline and "$match" in pipeline[0] else {}
+
+
+def analyze(name, command, explain):
+    stages = set()
+    for plan in walk(explain, "winningPlan"):
+        stages.update(walk(plan, "stage"))
+    indexes = sorted(set(walk(explain, "indexName")))
+    stats = next((s for s in walk(explain, "executionStats") if isinstance(s, dict) and "totalDocsExamined" in s), {})
+    examined = stats.get("totalDocsExamined", 0)
+    returned = stats.get("nReturned", 0)
+
+    problems = []
+    if "COLLSCAN" in stages and command_filter(name, command):
+        problems.append("COLLSCAN")
+    if "SORT" in stages:
+        problems.append("in-memory SORT")
+    if examined >= MIN_EXAMINED_FOR_RATIO and examined / max(returned, 1) > MAX_EXAMINED_RATIO:
+        problems.append(f"examined/returned {examined}/{returned}")
+
+    return {
+        "stages": sorted(stages),
+        "indexes": indexes,
+        "docs_examined": examined,
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "returned": returned,
+        "problems": problems,
+    }
+
+
+class QueryPlanTester:
+    def __init__(self):
+        self.db = server.db
+        self.client = None
+        self.tokens = {}
+        self.ids = {}
+        self.routes_run = 0
+        self.routes_passed = 0
+        self.report = {}
+
+    async def seed(self):
+        """Seed enough documents that a missing index shows up in the examined ratio"""
+        await server.client.drop_database(os.environ["DB_NAME"])
+        await server.ensure_indexes()
+
+        now = datetime.now(timezone.utc)
+        categories = ["Web App", "Mobile App", "API", "Template", "Plugin", "Script"]
+        tag_pool = [f"tag{i}" for i in range(20)]
+        tech_pool = ["React", "FastAPI", "MongoDB", "Vue", "Django", "Node", "Flutter", "Go"]
+
+        users = [{
+            "id": str(uuid.uuid4()),
+            "email": f"user{i}@example.com",
+            "name": f"User {i}",
+            "password": "x",
+            "role": "admin" if i == 0 else "user",
+            "created_at": now.isoformat()
+        } for i in range(200)]
+        products = [{
+            "id": str(uuid.uuid4()),
+            "title": f"Product {i}",
+            "tagline": "Seeded product",
+            "description": f"Description for product {i}",
+            "price": float(random.randint(0, 5000)),
+            "category": random.choice(categories),
+            "tags": random.sample(tag_pool, 3),
+            "tech_stack": random.sample(tech_pool, 2),
+            "license_type": "Single-use",
+            "thumbnail": None,
+            "gallery": [],
+            "is_published": i % 10 != 0,
+            "file_path": f"products/objects/00/{i}.zip",
+            "downloads": random.randint(0, 1000),
+            "rating": round(random.uniform(0, 5), 2),
+            "reviews_count": 0,
+            "version": 1,
+            "created_at": (now - timedelta(minutes=i)).isoformat()
+        } for i in range(3000)]
+        published = [product for product in products if product["is_published"]]
+
+        orders = []
+        for i in range(5000):
+            product = random.choice(published)
+            completed = i % 5 != 0
+            orders.append({
+                "id": str(uuid.uuid4()),
+                "product_id": product["id"],
+                "user_id": random.choice(users[1:])["id"],
+                "amount": product["price"],
+                "coupon_code": None,
+                "razorpay_order_id": f"order_{i}",
+                "razorpay_payment_id": f"pay_{i}" if completed else None,
+                "status": "completed" if completed else "pending",
+                "license_key": str(uuid.uuid4()) if completed else None,
+                "created_at": (now - timedelta(minutes=i)).isoformat(),
+                "paid_at": now.isoformat() if completed else None,
+                "expires_at": None if completed else (now + timedelta(hours=1)).isoformat()
+            })
+        buyer, owned = users[1], published[0]
+        orders.append({**orders[1], "id": str(uuid.uuid4()), "user_id": buyer["id"], "product_id": owned["id"], "license_key": str(uuid.uuid4())})
+
+        reviews = [{
+            "id": str(uuid.uuid4()),
+            "product_id": random.choice(published)["id"],
+            "user_id": random.choice(users[1:])["id"],
+            "user_name": "Reviewer",
+            "rating": random.randint(1, 5),
+            "comment": "Seeded review",
+            "is_approved": i % 3 != 0,
+            "created_at": (now - timedelta(minutes=i)).isoformat()
+        } for i in range(4000)]
+        coupons = [{
+            "id": str(uuid.uuid4()),
+            "code": "FREE100" if i == 0 else f"SAVE{i}",
+            "discount_type": "percent",
+            "discount_value": 100 if i == 0 else 10,
+            "min_purchase": 0,
+            "max_uses": None,
+            "expires_at": None,
+            "uses": 0,
+            "is_active": True,
+            "created_at": now.isoformat()
+        } for i in range(50)]
+
+        image_assets = [{
+            "hash": hashlib.sha256(SEED_IMAGE if i == 0 else f"image-{i}".encode()).hexdigest(),
+            "variants": {variant: {"webp": f"https://example.com/{i}/{variant}.webp"} for variant in ("card", "detail")},
+            "created_at": now.isoformat()
+        } for i in range(500)]
+
+        pending_reviews = [review["id"] for review in reviews if not review["is_approved"]]
+        await self.db.users.insert_many(users)
+        await self.db.products.insert_many(products)
+        await self.db.orders.insert_many(orders)
+        await self.db.reviews.insert_many(reviews)
+        await self.db.coupons.insert_many(coupons)
+        await self.db.image_assets.insert_many(image_assets)
+        await server.reconcile_leaderboards()
+
+        self.tokens = {
+            "admin": server.create_token({"sub": users[0]["id"]}, timedelta(minutes=30)),
+            "user": server.create_token({"sub": buyer["id"]}, timedelta(minutes=30)),
+        }
+        self.ids = {
+            "product": owned["id"],
+            "other_products": [published[1]["id"], published[2]["id"]],
+            "order": orders[-1]["id"],
+            "license": orders[-1]["license_key"],
+            "pending_review": pending_reviews[0],
+            "pending_reviews": pending_reviews[1:501],
+            "category": owned["category"],
+        }
+
+    def routes(self):
+        product = self.ids["product"]
+        return [
+            ("GET /products newest", "GET", "/api/products", {"params": {"sort": "newest"}}, None, 200),
+            ("GET /products popular", "GET", "/api/products", {"params": {"sort": "popular"}}, None, 200),
+            ("GET /products rating", "GET", "/api/products", {"params": {"sort": "rating"}}, None, 200),
+            ("GET /products price_low", "GET", "/api/products", {"params": {"sort": "price_low"}}, None, 200),
+            ("GET /products category", "GET", "/api/products", {"params": {"category": self.ids["category"]}}, None, 200),
+            ("GET /products tags", "GET", "/api/products", {"params": {"tags": "tag1,tag2"}}, None, 200),
+            ("GET /products summary", "GET", "/api/products", {"params": {"view": "summary"}}, None, 200),
+            ("GET /products search", "GET", "/api/products", {"params": {"search": "Product 1"}}, None, 200),
+            ("GET /products/{id}", "GET", f"/api/products/{product}", {}, None, 200),
+            ("GET /products/{id}/detail", "GET", f"/api/products/{product}/detail", {}, "user", 200),
+            ("GET /reviews/{product_id}", "GET", f"/api/reviews/{product}", {}, None, 200),
+            ("GET /auth/me", "GET", "/api/auth/me", {}, "user", 200),
+            ("GET /orders/my-orders", "GET", "/api/orders/my-orders", {}, "user", 200),
+            ("POST /reviews", "POST", "/api/reviews", {"json": {"product_id": product, "rating": 5, "comment": "Great"}}, "user", 200),
+            ("POST /orders/create free", "POST", "/api/orders/create", {"params": {"product_id": self.ids["other_products"][0], "coupon_code": "FREE100"}}, "user", 200),
+            ("POST /orders/checkout free", "POST", "/api/orders/checkout", {"json": {"product_ids": self.ids["other_products"], "coupon_code": "FREE100"}}, "user", 200),
+            ("POST /licenses/verify unknown", "POST", "/api/licenses/verify", {"json": {"license_key": "not-a-license"}}, None, 200),
+            ("POST /licenses/verify", "POST", "/api/licenses/verify", {"json": {"license_key": self.ids["license"]}}, None, 200),
+            ("GET /admin/analytics", "GET", "/api/admin/analytics", {}, "admin", 200),
+            ("GET /admin/orders", "GET", "/api/admin/orders", {}, "admin", 200),
+            ("GET /admin/reviews", "GET", "/api/admin/reviews", {}, "admin", 200),
+            ("GET /admin/coupons", "GET", "/api/admin/coupons", {}, "admin", 200),
+            ("PUT /admin/reviews/{id}/approve", "PUT", f"/api/admin/reviews/{self.ids['pending_review']}/approve", {}, "admin", 200),
+            ("POST /admin/products/{id}/images", "POST", f"/api/admin/products/{product}/images", {"files": {"file": ("seed.png", SEED_IMAGE, "image/png")}}, "admin", 200),
+            ("POST /admin/reviews/moderate", "POST", "/api/admin/reviews/moderate", {"json": {"review_ids": self.ids["pending_reviews"], "action": "approve"}}, "admin", 200),
+        ]
+
+    async def run_route(self, name, method, path, options, role, expected_status):
+        headers = {"Authorization": f"Bearer {self.tokens[role]}"} if role else {}
+        capture.route = name
+        try:
+            response = await self.client.request(method, path, headers=headers, **options)
+        finally:
+            capture.route = None
+
+        self.report[name] = {"status": response.status_code, "queries": [], "passed": True}
+        if response.status_code != expected_status:
+            self.report[name]["passed"] = False
+            print(f"❌ {name} - Expected {expected_status}, got {response.status_code}: {response.text[:200]}")
+
+    async def explain_captured(self):
+        for captured in capture.commands:
+            collection = next(iter(captured["command"].values()))
+            for statement in split_statements(captured["name"], captured["command"]):
+                explain = await server.client[captured["database"]].command(
+                    {"explain": statement, "verbosity": "executionStats"}
+                )
+                result = analyze(captured["name"], statement, explain)
+                accepted = ACCEPTED_PLANS.get((captured["route"], collection))
+                if accepted and result["problems"]:
+                    result["accepted"] = accepted
+                result.update({"collection": collection, "command": captured["name"]})
+                route = self.report[captured["route"]]
+                route["queries"].append(result)
+                if result["problems"] and not accepted:
+                    route["passed"] = False
+
+    def print_report(self):
+        for name, route in self.report.items():
+            self.routes_run += 1
+            if route["passed"]:
+                self.routes_passed += 1
+            print(f"\n{'✅' if route['passed'] else '❌'} {name} ({len(route['queries'])} queries)")
+            for query in route["queries"]:
+                plan = ", ".join(query["indexes"]) or "/".join(query["stages"]) or "-"
+                line = f"   {query['collection']}.{query['command']}: {plan} examined={query['docs_examined']} returned={query['returned']}"
+                if query["problems"]:
+                    line += f" ⚠️  {'; '.join(query['problems'])}"
+                    if query.get("accepted"):
+                        line += f" (accepted: {query['accepted']})"
+                print(line)
+
+        REPORT_PATH.parent.mkdir(exist_ok=True)
+        REPORT_PATH.write_text(json.dumps(self.report, indent=2, default=str))
+
+    async def run(self):
+        await self.seed()
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            self.client = client
+            for route in self.routes():
+                await self.run_route(*route)
+        await self.explain_captured()
+        self.print_report()
+        await server.client.drop_database(os.environ["DB_NAME"])
+
+
+def main():
+    print("🚀 Starting CodeMart query-plan checks...")
+    tester = QueryPlanTester()
+    asyncio.run(tester.run())
+
+    print("\n" + "="*50)
+    print("QUERY PLAN RESULTS")
+    print("="*50)
+    print(f"📊 Routes passed: {tester.routes_passed}/{tester.routes_run}")
+    print(f"📝 Report written to {REPORT_PATH.relative_to(ROOT_DIR)}")
+
+    return 0 if tester.routes_passed == tester.routes_run else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
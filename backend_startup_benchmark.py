@@ -0,0 +1,174 @@
+"""Cold-start benchmark for the CodeMart API.
+
+Profiles `import server` with `python -X importtime`, then repeatedly boots the
+app under uvicorn with STARTUP_PROFILE=true and measures time-to-first-request:
+from process launch until GET /api/products/suggest answers. Startup hooks need
+a reachable MongoDB, as in backend_query_plan_test.py.
+
+    MONGO_URL=mongodb://localhost:27017 python backend_startup_benchmark.py
+
+Fails when the median time-to-first-request exceeds STARTUP_BUDGET_MS. Results
+are written to test_reports/startup_benchmark.json.
+"""
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+ROOT_DIR = Path(__file__).parent
+BACKEND_DIR = ROOT_DIR / "backend"
+REPORT_PATH = ROOT_DIR / "test_reports" / "startup_benchmark.json"
+
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "2500"))
+STARTUP_RUNS = int(os.environ.get("STARTUP_RUNS", "5"))
+STARTUP_TIMEOUT_SECONDS = 60
+IMPORT_REPORT_LIMIT = 15
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+HOOK_LINE = re.compile(r"Startup hook (\w+) took ([\d.]+) ms")
+
+ENV = {
+    **os.environ,
+    "DB_NAME": os.environ.get("STARTUP_BENCHMARK_DB_NAME", "codemart_startup_benchmark"),
+    "STARTUP_PROFILE": "true",
+}
+for name, value in {
+    "MONGO_URL": "mongodb://localhost:27017",
+    "JWT_SECRET": "startup-benchmark",
+    "JWT_ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "RAZORPAY_KEY_ID": "rzp_test",
+    "RAZORPAY_KEY_SECRET": "rzp_test_secret",
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_ANON_KEY": "anon",
+    "SUPABASE_BUCKET_NAME": "products",
+}.items():
+    ENV.setdefault(name, value)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StartupBenchmark:
+    def __init__(self):
+        self.imports = []
+        self.import_total_ms = 0.0
+        self.runs = []
+
+    def profile_imports(self):
+        """Per-module import cost of `import server`, as reported by -X importtime"""
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import server"],
+            cwd=BACKEND_DIR, env=ENV, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"❌ import server failed:\n{result.stderr[-2000:]}")
+            return False
+
+        # Children are printed before their parent, so direct imports are only
+        # known to belong to server.py once its own top-level line shows up
+        children = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_LINE.match(line)
+            if not match:
+                continue
+            self_us, cumulative_us, indent, module = match.groups()
+            depth = len(indent) // 2
+            if depth == 1:
+                children.append({"module": module, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+            elif depth == 0:
+                if module == "server":
+                    self.import_total_ms = int(cumulative_us) / 1000
+                    self.imports = children
+                children = []
+        self.imports.sort(key=lambda entry: entry["cumulative_ms"], reverse=True)
+
+        print(f"\n📦 import server: {self.import_total_ms:.1f} ms")
+        for entry in self.imports[:IMPORT_REPORT_LIMIT]:
+            print(f"   {entry['module']:<40} {entry['cumulative_ms']:>8.1f} ms")
+        return True
+
+    def measure_run(self, run):
+        port = free_port()
+        url = f"http://127.0.0.1:{port}/api/products/suggest?q=a"
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=BACKEND_DIR, env=ENV, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        first_request_ms = None
+        try:
+            while time.perf_counter() - started < STARTUP_TIMEOUT_SECONDS and process.poll() is None:
+                try:
+                    response = requests.get(url, timeout=1)
+                    if response.status_code == 200:
+                        first_request_ms = (time.perf_counter() - started) * 1000
+                        break
+                except requests.exceptions.ConnectionError:
+                    pass
+                time.sleep(0.01)
+        finally:
+            process.terminate()
+            try:
+                output, _ = process.communicate(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                output, _ = process.communicate()
+
+        hooks = {name: float(ms) for name, ms in HOOK_LINE.findall(output)}
+        if first_request_ms is None:
+            print(f"❌ Run {run}: app did not serve a request within {STARTUP_TIMEOUT_SECONDS}s")
+            print(output[-2000:])
+            return False
+
+        self.runs.append({"time_to_first_request_ms": first_request_ms, "startup_hooks_ms": hooks})
+        hook_summary = ", ".join(f"{name} {ms:.1f} ms" for name, ms in hooks.items())
+        print(f"⏱️  Run {run}: first request after {first_request_ms:.1f} ms ({hook_summary})")
+        return True
+
+
+def main():
+    print("🚀 Starting CodeMart startup benchmark...")
+    benchmark = StartupBenchmark()
+    if not benchmark.profile_imports():
+        return 1
+
+    print()
+    for run in range(1, STARTUP_RUNS + 1):
+        if not benchmark.measure_run(run):
+            return 1
+
+    median_ms = statistics.median(run["time_to_first_request_ms"] for run in benchmark.runs)
+    passed = median_ms <= STARTUP_BUDGET_MS
+
+    REPORT_PATH.parent.mkdir(exist_ok=True)
+    REPORT_PATH.write_text(json.dumps({
+        "import_total_ms": benchmark.import_total_ms,
+        "imports": benchmark.imports,
+        "runs": benchmark.runs,
+        "median_time_to_first_request_ms": median_ms,
+        "budget_ms": STARTUP_BUDGET_MS,
+        "passed": passed
+    }, indent=2))
+
+    print("\n" + "="*50)
+    print("STARTUP BENCHMARK RESULTS")
+    print("="*50)
+    print(f"{'✅' if passed else '❌'} Median time-to-first-request: {median_ms:.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)")
+    print(f"📝 Report written to {REPORT_PATH.relative_to(ROOT_DIR)}")
+
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -87,6 +87,79 @@ const AdminDashboard = () => {
     fetchReviews();
   }, []);
 
+  const subscribeToEvents = (events) => {
+    events.addEventListener('order.completed', (event) => {
+      const order = JSON.parse(event.data);
+      setOrders((prev) => [order, ...prev.filter((o) => o.id !== order.id)]);
+      setAnalytics((prev) =>
+        prev && {
+          ...prev,
+          total_orders: prev.total_orders + 1,
+          total_revenue: prev.total_revenue + order.amount,
+        }
+      );
+    });
+    events.addEventListener('review.submitted', (event) => {
+      const review = JSON.parse(event.data);
+      setReviews((prev) => [review, ...prev]);
+    });
+    events.addEventListener('review.approved', (event) => {
+      const { id } = JSON.parse(event.data);
+      setReviews((prev) => prev.map((r) => (r.id === id ? { ...r, is_approved: true } : r)));
+    });
+    events.addEventListener('reviews.approved', (event) => {
+      const { ids } = JSON.parse(event.data);
+      setReviews((prev) => prev.map((r) => (ids.includes(r.id) ? { ...r, is_approved: true } : r)));
+    });
+    events.addEventListener('reviews.rejected', (event) => {
+      const { ids } = JSON.parse(event.data);
+      const rejectedAt = new Date().toISOString();
+      setReviews((prev) =>
+        prev.map((r) => (ids.includes(r.id) ? { ...r, is_approved: false, rejected_at: rejectedAt } : r))
+      );
+    });
+    events.addEventListener('product.changed', () => fetchProducts());
+    events.addEventListener('resync', () => {
+      fetchAnalytics();
+      fetchProducts();
+      fetchOrders();
+      fetchReviews();
+    });
+  };
+
+  useEffect(() => {
+    let events = null;
+    let retryTimer = null;
+    let closed = false;
+
+    // EventSource cannot send headers, so connect with a short-lived stream token instead of the access token
+    const connect = async () => {
+      try {
+        const response = await axios.post(`${API}/admin/events/token`, {}, {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        if (closed) return;
+        events = new EventSource(`${API}/admin/events?stream_token=${encodeURIComponent(response.data.token)}`);
+        subscribeToEvents(events);
+        events.onerror = () => {
+          // The browser reconnects on its own until the stream token is rejected; then fetch a fresh one
+          if (events.readyState === EventSource.CLOSED && !closed) {
+            retryTimer = setTimeout(connect, 5000);
+          }
+        };
+      } catch (error) {
+        if (!closed) retryTimer = setTimeout(connect, 5000);
+      }
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (events) events.close();
+    };
+  }, []);
+
   const fetchAnalytics = async () => {
     try {
       const response = await axios.get(`${API}/admin/analytics`, {
@@ -243,6 +316,22 @@ const AdminDashboard = () => {
     }
   };
 
+  const handleModerateReviews = async (reviewIds, action) => {
+    try {
+      const response = await axios.post(
+        `${API}/admin/reviews/moderate`,
+        { review_ids: reviewIds, action },
+        { headers: { Authorization: `Bearer ${token}` } }
+      );
+      toast.success(`${response.data.modified} reviews ${action}d`);
+      fetchReviews();
+    } catch (error) {
+      toast.error(`Failed to ${action} reviews`);
+    }
+  };
+
+  const pendingReviewIds = reviews.filter((r) => !r.is_approved && !r.rejected_at).map((r) => r.id);
+
   const resetProductForm = () => {
     setProductForm({
       title: '',
@@ -444,7 +533,19 @@ const AdminDashboard = () => {
                     <TableRow key={order.id} data-testid={`order-row-${order.id}`}>
                       <TableCell className="font-mono text-sm">{order.id.slice(0, 8)}...</TableCell>
                       <TableCell className="font-mono text-sm">{order.user_id.slice(0, 8)}...</TableCell>
-                      <TableCell className="font-mono text-sm">{order.product_id.slice(0, 8)}...</TableCell>
+                      <TableCell className="font-mono text-sm">
+                        {order.items?.length ? (
+                          <div className="flex flex-col">
+                            {order.items.map((item) => (
+                              <span key={item.product_id} title={item.title}>
+                                {item.product_id.slice(0, 8)}...
+                              </span>
+                            ))}
+                          </div>
+                        ) : (
+                          `${order.product_id.slice(0, 8)}...`
+                        )}
+                      </TableCell>
                       <TableCell>₹{order.amount}</TableCell>
                       <TableCell>
                         <span
@@ -513,6 +614,24 @@ const AdminDashboard = () => {
 
           {/* Reviews Tab */}
           <TabsContent value="reviews">
+            {pendingReviewIds.length > 0 && (
+              <div className="flex justify-end gap-2 mb-4">
+                <Button
+                  variant="outline"
+                  onClick={() => handleModerateReviews(pendingReviewIds, 'reject')}
+                  data-testid="reject-all-reviews"
+                >
+                  Reject all pending ({pendingReviewIds.length})
+                </Button>
+                <Button
+                  onClick={() => handleModerateReviews(pendingReviewIds, 'approve')}
+                  data-testid="approve-all-reviews"
+                >
+                  <Check className="h-4 w-4 mr-2" />
+                  Approve all pending ({pendingReviewIds.length})
+                </Button>
+              </div>
+            )}
             <div className="glass-effect rounded-xl overflow-hidden" data-testid="reviews-table">
               <Table>
                 <TableHeader>
@@ -535,10 +654,14 @@ const AdminDashboard = () => {
                       <TableCell>
                         <span
                           className={`px-2 py-1 rounded-full text-xs ${
-                            review.is_approved ? 'bg-green-100 text-green-700' : 'bg-yellow-100 text-yellow-700'
+                            review.is_approved
+                              ? 'bg-green-100 text-green-700'
+                              : review.rejected_at
+                              ? 'bg-red-100 text-red-700'
+                              : 'bg-yellow-100 text-yellow-700'
                           }`}
                         >
-                          {review.is_approved ? 'Approved' : 'Pending'}
+                          {review.is_approved ? 'Approved' : review.rejected_at ? 'Rejected' : 'Pending'}
                         </span>
                       </TableCell>
                       <TableCell>
@@ -20,6 +20,7 @@ const Home = () => {
   const [products, setProducts] = useState([]);
   const [loading, setLoading] = useState(true);
   const [search, setSearch] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
   const [category, setCategory] = useState('');
   const [sort, setSort] = useState('newest');
   const user = JSON.parse(localStorage.getItem('user') || '{}');
@@ -28,9 +29,25 @@ const Home = () => {
     fetchProducts();
   }, [category, sort]);
 
+  useEffect(() => {
+    if (!search.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/products/suggest`, { params: { q: search } });
+        setSuggestions(response.data);
+      } catch (error) {
+        setSuggestions([]);
+      }
+    }, 100);
+    return () => clearTimeout(timer);
+  }, [search]);
+
   const fetchProducts = async () => {
     try {
-      const params = new URLSearchParams();
+      const params = new URLSearchParams({ view: 'summary' });
       if (category) params.append('category', category);
       if (sort) params.append('sort', sort);
       if (search) params.append('search', search);
@@ -45,9 +62,19 @@ const Home = () => {
   };
 
   const handleSearch = () => {
+    setSuggestions([]);
     fetchProducts();
   };
 
+  const handleSuggestion = (suggestion) => {
+    if (suggestion.product_id) {
+      navigate(`/product/${suggestion.product_id}`);
+      return;
+    }
+    setSearch(suggestion.text);
+    setSuggestions([]);
+  };
+
   return (
     <div className="min-h-screen">
       {/* Header */}
@@ -106,14 +133,35 @@ const Home = () => {
 
           {/* Search Bar */}
           <div className="max-w-2xl mx-auto flex gap-2" data-testid="search-section">
-            <Input
-              placeholder="Search projects..."
-              value={search}
-              onChange={(e) => setSearch(e.target.value)}
-              onKeyPress={(e) => e.key === 'Enter' && handleSearch()}
-              className="flex-1"
-              data-testid="search-input"
-            />
+            <div className="relative flex-1">
+              <Input
+                placeholder="Search projects..."
+                value={search}
+                onChange={(e) => setSearch(e.target.value)}
+                onKeyPress={(e) => e.key === 'Enter' && handleSearch()}
+                onBlur={() => setTimeout(() => setSuggestions([]), 150)}
+                data-testid="search-input"
+              />
+              {suggestions.length > 0 && (
+                <ul
+                  className="absolute z-10 mt-1 w-full bg-white border rounded-md shadow-lg text-left"
+                  data-testid="search-suggestions"
+                >
+                  {suggestions.map((suggestion) => (
+                    <li
+                      key={`${suggestion.kind}-${suggestion.product_id || suggestion.text}`}
+                      className="px-3 py-2 cursor-pointer hover:bg-purple-50 flex justify-between"
+                      onMouseDown={() => handleSuggestion(suggestion)}
+                    >
+                      <span>{suggestion.text}</span>
+                      {suggestion.kind !== 'title' && (
+                        <span className="text-xs text-gray-500">{suggestion.kind}</span>
+                      )}
+                    </li>
+                  ))}
+                </ul>
+              )}
+            </div>
             <Button onClick={handleSearch} data-testid="search-btn">
               <Search className="h-4 w-4" />
             </Button>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { Code, Download, Star, ShoppingCart, ExternalLink, ArrowLeft } from 'lucide-react';
@@ -26,18 +26,22 @@ const ProductDetail = () => {
   const [rating, setRating] = useState(5);
   const [comment, setComment] = useState('');
   const [couponCode, setCouponCode] = useState('');
+  // One Idempotency-Key per purchase attempt (product + coupon), reused by retries until it succeeds
+  const purchaseKeys = useRef({});
   const user = JSON.parse(localStorage.getItem('user') || '{}');
   const token = localStorage.getItem('token');
 
   useEffect(() => {
-    fetchProduct();
-    fetchReviews();
+    fetchProductDetail();
   }, [id]);
 
-  const fetchProduct = async () => {
+  const fetchProductDetail = async () => {
     try {
-      const response = await axios.get(`${API}/products/${id}`);
-      setProduct(response.data);
+      const response = await axios.get(`${API}/products/${id}/detail`, {
+        headers: token ? { Authorization: `Bearer ${token}` } : {},
+      });
+      setProduct(response.data.product);
+      setReviews(response.data.reviews);
     } catch (error) {
       toast.error('Failed to load product');
     } finally {
@@ -45,15 +49,6 @@ const ProductDetail = () => {
     }
   };
 
-  const fetchReviews = async () => {
-    try {
-      const response = await axios.get(`${API}/reviews/${id}`);
-      setReviews(response.data);
-    } catch (error) {
-      console.error('Failed to load reviews');
-    }
-  };
-
   const handlePurchase = async () => {
     if (!token) {
       toast.error('Please login to purchase');
@@ -61,14 +56,20 @@ const ProductDetail = () => {
       return;
     }
 
+    const attempt = `${id}:${couponCode}`;
+    if (!purchaseKeys.current[attempt]) {
+      purchaseKeys.current[attempt] = crypto.randomUUID();
+    }
+
     try {
       const response = await axios.post(
         `${API}/orders/create?product_id=${id}${couponCode ? `&coupon_code=${couponCode}` : ''}`,
         {},
         {
-          headers: { Authorization: `Bearer ${token}` },
+          headers: { Authorization: `Bearer ${token}`, 'Idempotency-Key': purchaseKeys.current[attempt] },
         }
       );
+      delete purchaseKeys.current[attempt];
 
       if (response.data.is_free) {
         toast.success('Product unlocked! Check your dashboard.');
@@ -93,7 +94,10 @@ const ProductDetail = () => {
                 razorpay_signature: paymentResponse.razorpay_signature,
               },
               {
-                headers: { Authorization: `Bearer ${token}` },
+                headers: {
+                  Authorization: `Bearer ${token}`,
+                  'Idempotency-Key': paymentResponse.razorpay_payment_id,
+                },
               }
             );
             toast.success('Payment successful! Check your dashboard.');
@@ -110,6 +114,11 @@ const ProductDetail = () => {
       const rzp = new window.Razorpay(options);
       rzp.open();
     } catch (error) {
+      const status = error.response?.status;
+      // A 4xx is a final answer for this attempt; network errors, 409s and 5xx retry with the same key
+      if (status >= 400 && status < 500 && status !== 409) {
+        delete purchaseKeys.current[attempt];
+      }
       toast.error(error.response?.data?.detail || 'Purchase failed');
     }
   };
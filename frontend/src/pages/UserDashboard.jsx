@@ -39,10 +39,11 @@ const UserDashboard = () => {
     }
   };
 
-  const handleDownload = async (orderId) => {
+  const handleDownload = async (orderId, productId) => {
     try {
       const response = await axios.get(`${API}/orders/${orderId}/download`, {
         headers: { Authorization: `Bearer ${token}` },
+        params: productId ? { product_id: productId } : {},
       });
       window.open(response.data.download_url, '_blank');
       toast.success('Download started');
@@ -51,6 +52,12 @@ const UserDashboard = () => {
     }
   };
 
+  // Cart orders carry one license and download per line under `items`
+  const orderLines = (order) =>
+    order.items?.length
+      ? order.items.map((item) => ({ productId: item.product_id, title: item.title, licenseKey: item.license_key }))
+      : [{ productId: null, title: null, licenseKey: order.license_key }];
+
   return (
     <div className="min-h-screen">
       {/* Header */}
@@ -115,26 +122,38 @@ const UserDashboard = () => {
                       </span>
                     </TableCell>
                     <TableCell>
-                      {order.license_key ? (
-                        <div className="flex items-center gap-2">
-                          <Key className="h-4 w-4 text-purple-600" />
-                          <span className="font-mono text-sm">{order.license_key.slice(0, 12)}...</span>
-                        </div>
-                      ) : (
-                        <span className="text-gray-400">-</span>
-                      )}
+                      <div className="flex flex-col gap-2">
+                        {orderLines(order).map((line) => (
+                          <div key={line.productId || order.id} className="flex items-center gap-2">
+                            {line.licenseKey ? (
+                              <>
+                                <Key className="h-4 w-4 text-purple-600" />
+                                <span className="font-mono text-sm">{line.licenseKey.slice(0, 12)}...</span>
+                              </>
+                            ) : (
+                              <span className="text-gray-400">-</span>
+                            )}
+                            {line.title && <span className="text-sm text-gray-600">{line.title}</span>}
+                          </div>
+                        ))}
+                      </div>
                     </TableCell>
                     <TableCell>{new Date(order.created_at).toLocaleDateString()}</TableCell>
                     <TableCell>
                       {order.status === 'completed' && (
-                        <Button
-                          size="sm"
-                          onClick={() => handleDownload(order.id)}
-                          data-testid={`download-btn-${order.id}`}
-                        >
-                          <Download className="h-4 w-4 mr-2" />
-                          Download
-                        </Button>
+                        <div className="flex flex-col gap-2">
+                          {orderLines(order).map((line) => (
+                            <Button
+                              key={line.productId || order.id}
+                              size="sm"
+                              onClick={() => handleDownload(order.id, line.productId)}
+                              data-testid={`download-btn-${order.id}${line.productId ? `-${line.productId}` : ''}`}
+                            >
+                              <Download className="h-4 w-4 mr-2" />
+                              Download
+                            </Button>
+                          ))}
+                        </div>
                       )}
                     </TableCell>
                   </TableRow>
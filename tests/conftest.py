@@ -0,0 +1,21 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py reads its configuration at import time
+for name, value in {
+    "MONGO_URL": "mongodb://localhost:27017",
+    "DB_NAME": "codemart_test",
+    "JWT_SECRET": "test-secret",
+    "JWT_ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "RAZORPAY_KEY_ID": "rzp_test",
+    "RAZORPAY_KEY_SECRET": "rzp_test_secret",
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_ANON_KEY": "anon",
+    "SUPABASE_BUCKET_NAME": "products",
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
@@ -0,0 +1,19 @@
+import server
+
+
+def test_top_for_unknown_category_allocates_no_board():
+    leaderboards = server.ProductLeaderboards()
+    leaderboards.upsert_product({"id": "p1", "category": "tools", "downloads": 5, "rating": 4.0})
+    boards = set(leaderboards.boards)
+
+    for category in ["nope", "ünïcode", "x" * 200]:
+        assert leaderboards.top("downloads", 10, category=category) == []
+
+    assert set(leaderboards.boards) == boards
+    assert leaderboards.top("downloads", 10, category="tools") == [("p1", 5)]
+
+
+def test_remove_product_allocates_no_board():
+    leaderboards = server.ProductLeaderboards()
+    leaderboards.remove_product("missing")
+    assert leaderboards.boards == {}
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length):
+        return self.documents[:length] if length else self.documents
+
+
+class FakeUpdateResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeReviews:
+    def __init__(self, reviews):
+        self.reviews = reviews
+
+    def matches(self, review, query):
+        for field, condition in query.items():
+            if isinstance(condition, dict):
+                if review.get(field) not in condition["$in"]:
+                    return False
+            elif review.get(field) != condition:
+                return False
+        return True
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(review) for review in self.reviews if self.matches(review, query)])
+
+    async def update_many(self, query, update):
+        matched = [review for review in self.reviews if self.matches(review, query)]
+        for review in matched:
+            review.update(update["$set"])
+        return FakeUpdateResult(len(matched))
+
+
+class FakeDatabase:
+    def __init__(self, reviews):
+        self.reviews = FakeReviews(reviews)
+
+
+@pytest.fixture
+def published(monkeypatch):
+    events = []
+    reviews = [
+        {"id": "r1", "product_id": "p1", "is_approved": False, "rejected_at": None},
+        {"id": "r2", "product_id": "p2", "is_approved": False, "rejected_at": None},
+    ]
+
+    async def recompute_product_ratings(product_ids):
+        pass
+
+    monkeypatch.setattr(server, "db", FakeDatabase(reviews))
+    monkeypatch.setattr(server, "recompute_product_ratings", recompute_product_ratings)
+    monkeypatch.setattr(server, "publish_admin_event", lambda event_type, data: events.append((event_type, data)))
+    return events
+
+
+@pytest.mark.parametrize("action, event_type", [("approve", "reviews.approved"), ("reject", "reviews.rejected")])
+def test_bulk_moderation_publishes_dashboard_event(published, action, event_type):
+    moderation = server.ReviewModeration(review_ids=["r1", "r2"], action=action)
+    result = asyncio.run(server.moderate_reviews(moderation, admin={"id": "admin"}))
+
+    assert result["modified"] == 2
+    assert [event for event, _ in published] == [event_type]
+    assert sorted(published[0][1]["ids"]) == ["r1", "r2"]
@@ -0,0 +1,45 @@
+import random
+
+import numpy as np
+
+import server
+
+
+def product(i, category):
+    return {"id": f"p{i}", "title": f"Product {i}", "tagline": "", "price": 1.0, "category": category,
+            "tags": [], "tech_stack": [], "is_published": True}
+
+
+def dense_co_purchase(index, orders):
+    users, rows, cols = {}, [], []
+    for order in orders:
+        for product_id in [item["product_id"] for item in order.get("items", [])] or [order["product_id"]]:
+            rows.append(index.positions[product_id])
+            cols.append(users.setdefault(order["user_id"], len(users)))
+    purchases = np.zeros((len(index.product_ids), len(users)), dtype=np.float32)
+    purchases[rows, cols] = 1.0
+    norms = np.linalg.norm(purchases, axis=1, keepdims=True)
+    purchases = np.divide(purchases, norms, out=np.zeros_like(purchases), where=norms > 0)
+    return purchases @ purchases.T
+
+
+def test_co_purchase_matches_cosine_of_purchase_matrix():
+    rng = random.Random(7)
+    products = [product(i, rng.choice("ABC")) for i in range(40)]
+    orders = [{"user_id": f"u{rng.randint(0, 60)}", "product_id": f"p{rng.randint(0, 39)}"} for _ in range(300)]
+    orders.append({"user_id": "u1", "items": [{"product_id": "p1"}, {"product_id": "p2"}, {"product_id": "p3"}]})
+
+    index = server.RelatedProductsIndex(5)
+    index.build(products, orders)
+
+    assert np.allclose(index.co_purchase, dense_co_purchase(index, orders), atol=1e-6)
+
+
+def test_co_purchase_ranks_bought_together_products():
+    products = [product(i, "A") for i in range(4)]
+    orders = [{"user_id": f"u{i}", "items": [{"product_id": "p0"}, {"product_id": "p3"}]} for i in range(3)]
+
+    index = server.RelatedProductsIndex(3)
+    index.build(products, orders)
+
+    assert index.lookup("p0", 1)[0]["id"] == "p3"
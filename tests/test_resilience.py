@@ -0,0 +1,259 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = server.CircuitBreaker("test", failure_threshold=2, reset_seconds=0.05)
+    monkeypatch.setitem(server.breakers, "test", breaker)
+    monkeypatch.setattr(server, "RETRY_BASE_DELAY_SECONDS", 0.001)
+    return breaker
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+
+async def succeed(timeout):
+    return "ok"
+
+
+async def fail_transport(timeout):
+    raise httpx.ConnectError("down")
+
+
+def call(operation, **kwargs):
+    return asyncio.run(server.call_dependency("test", operation, timeout=kwargs.pop("timeout", 1.0), **kwargs))
+
+
+def test_breaker_opens_after_threshold_and_rejects(breaker):
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.total_rejected == 1
+
+
+def test_breaker_half_open_probe_success_closes(breaker):
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_breaker_half_open_probe_failure_reopens(breaker):
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_abandoned_probe_reopens(breaker):
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.abandon_probe()
+    assert breaker.state == "open"
+    assert breaker.retry_after() >= 1
+
+
+def test_call_dependency_returns_result(breaker):
+    assert call(succeed) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_call_dependency_transport_failure_is_502(breaker):
+    with pytest.raises(HTTPException) as exc_info:
+        call(fail_transport)
+    assert exc_info.value.status_code == 502
+    assert breaker.failures == 1
+
+
+def test_call_dependency_timeout_is_504(breaker):
+    async def slow(timeout):
+        await asyncio.sleep(1)
+
+    with pytest.raises(HTTPException) as exc_info:
+        call(slow, timeout=0.01)
+    assert exc_info.value.status_code == 504
+
+
+def test_call_dependency_unbounded_total_outlasts_timeout(breaker):
+    # Streamed uploads rely on the operation's own per-phase timeouts instead
+    async def slow_stream(timeout):
+        await asyncio.sleep(0.05)
+        return "uploaded"
+
+    assert call(slow_stream, timeout=0.01, bound_total=False) == "uploaded"
+    assert breaker.failures == 0
+
+
+def test_call_dependency_open_breaker_is_503(breaker):
+    trip(breaker)
+    with pytest.raises(HTTPException) as exc_info:
+        call(succeed)
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+
+
+def test_call_dependency_5xx_response_counts_as_failure(breaker):
+    async def server_error(timeout):
+        return httpx.Response(503)
+
+    with pytest.raises(HTTPException) as exc_info:
+        call(server_error)
+    assert exc_info.value.status_code == 502
+    assert breaker.failures == 1
+
+
+def test_call_dependency_retries_then_succeeds(breaker):
+    attempts = []
+
+    async def flaky(timeout):
+        attempts.append(timeout)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("blip")
+        return "ok"
+
+    assert call(flaky, retries=1) == "ok"
+    assert len(attempts) == 2
+    assert breaker.state == "closed"
+
+
+def test_call_dependency_probe_with_caller_error_does_not_stick_half_open(breaker):
+    trip(breaker)
+    time.sleep(0.06)
+
+    async def bad_request(timeout):
+        raise ValueError("rejected by dependency")
+
+    with pytest.raises(ValueError):
+        call(bad_request)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert call(succeed) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_call_dependency_cancelled_probe_reopens(breaker):
+    trip(breaker)
+    time.sleep(0.06)
+
+    async def main():
+        async def hang(timeout):
+            await asyncio.sleep(10)
+
+        task = asyncio.create_task(server.call_dependency("test", hang, timeout=5.0))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert breaker.state == "open"
+
+
+def test_call_dependency_exhausted_deadline_keeps_probe(breaker):
+    trip(breaker)
+    time.sleep(0.06)
+
+    async def main():
+        token = server.request_deadline.set(time.monotonic() - 1)
+        try:
+            with pytest.raises(HTTPException) as exc_info:
+                await server.call_dependency("test", succeed, timeout=1.0)
+            assert exc_info.value.status_code == 504
+        finally:
+            server.request_deadline.reset(token)
+
+    asyncio.run(main())
+    # The probe was never taken, so the next caller still gets it
+    assert breaker.state == "open"
+    assert call(succeed) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_run_hedged_second_attempt_wins():
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+        return len(calls)
+
+    started = time.monotonic()
+    result = asyncio.run(server.run_hedged(attempt, timeout=2.0, hedge_after=0.02))
+    assert result == 2
+    assert time.monotonic() - started < 0.5
+
+
+def test_run_hedged_fast_first_attempt_is_not_hedged():
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(timeout)
+        return "first"
+
+    assert asyncio.run(server.run_hedged(attempt, timeout=1.0, hedge_after=0.5)) == "first"
+    assert len(calls) == 1
+
+
+def test_run_hedged_raises_when_all_attempts_fail():
+    async def attempt(timeout):
+        raise httpx.ConnectError("down")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(server.run_hedged(attempt, timeout=1.0, hedge_after=0.01))
+
+
+def test_run_hedged_times_out():
+    async def attempt(timeout):
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(server.run_hedged(attempt, timeout=0.05, hedge_after=0.01))
+
+
+def run_deadline_middleware(path):
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["deadline"] = server.request_deadline.get()
+
+    middleware = server.DeadlineMiddleware(app)
+    asyncio.run(middleware({"type": "http", "path": path, "headers": []}, None, None))
+    return seen["deadline"]
+
+
+def test_deadline_middleware_sets_budget():
+    deadline = run_deadline_middleware("/api/products")
+    assert deadline is not None
+    assert deadline - time.monotonic() <= server.REQUEST_DEADLINE_SECONDS
+
+
+@pytest.mark.parametrize("path", [
+    "/api/admin/products/abc/upload",
+    "/api/admin/products/abc/images",
+    "/api/admin/events",
+])
+def test_deadline_middleware_exempts_uploads_and_streams(path):
+    assert run_deadline_middleware(path) is None
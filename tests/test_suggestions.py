@@ -0,0 +1,23 @@
+import server
+
+
+def build_index():
+    index = server.SuggestionIndex()
+    index.build([
+        {"id": "p1", "title": "Admin Dashboard", "tags": ["react"], "tech_stack": ["FastAPI"], "downloads": 10, "is_published": True},
+        {"id": "p2", "title": "Landing Page", "tags": ["react"], "tech_stack": [], "downloads": 3, "is_published": True},
+    ])
+    return index
+
+
+def test_short_prefix_matches_are_memoised():
+    index = build_index()
+    assert [s["text"] for s in index.suggest("re", 5)] == ["react"]
+    assert set(index.short_prefixes) == {"re"}
+
+
+def test_short_prefixes_without_matches_are_not_memoised():
+    index = build_index()
+    for prefix in ["zq", "ж", "🙂x", "√"]:
+        assert index.suggest(prefix, 5) == []
+    assert index.short_prefixes == {}